@@ -0,0 +1,343 @@
+"""
+Concurrent-session load test for the dashboard, run headlessly with Streamlit's AppTest.
+
+Every simulated session runs app.py in this process against the local DuckDB backend,
+so sessions share the process-wide caches exactly as they would on one server. Sessions
+switch dashboard groups and tabs and change the staffing filters; the per-interaction
+latency percentiles, peak RSS and warehouse query count are reported and compared with
+a baseline.
+
+    python benchmarks/load_test.py --sessions 50 --providers 15000
+    python benchmarks/load_test.py --data-dir /tmp/snapshots_10x --write-baseline
+
+Exits with status 1 when a session raised an exception or a tracked number regressed
+more than --tolerance past the baseline.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Dashboard group -> (session-state key of its tabs, tab labels). Mirrors st.tabs() in app.py's groups.
+GROUPS = {
+    "Staffing Metrics": ("staffing_metrics_tab", [
+        "State - Resident Nurse Ratio",
+        "Provider - Resident Nurse Ratio",
+        "Nurse Hours",
+        "Contract Hours",
+    ]),
+    "Facility Metrics": ("facility_metrics_tab", [
+        "Hospital Occupancy Rate Trend - By Month",
+        "Hospital Occupancy Rate Trend - By Provider",
+        "Staffing and Hospital Occupancy Comparison",
+        "Hospital Throughput",
+        " Staffing & Patient Load Comparison",
+    ]),
+}
+
+# Tabs with the state/provider filters, and the widget key prefix of those filters.
+FILTER_TABS = {"Nurse Hours": "nurse_hours", "Contract Hours": "contract_hours"}
+
+STATES = ["CA", "FL", "IL", "NY", "OH", "PA", "TX"]
+ROLES = ["RNDON", "RNadmin", "RN", "LPNadmin", "LPN", "CNA", "NAtrn", "MedAide"]
+
+
+def write_synthetic_snapshots(out_dir, providers, days, seed=0):
+    """Writes Parquet snapshots of the three target tables with `providers` providers and `days` WorkDates."""
+    rng = np.random.default_rng(seed)
+    ccns = np.array([f"{100000 + i}" for i in range(providers)])
+    names = np.array([f"Nursing Home {i}" for i in range(providers)])
+    states = np.array(STATES)[np.arange(providers) % len(STATES)]
+    dates = pd.date_range("2024-04-01", periods=days).date
+
+    rows = np.repeat(np.arange(providers), days)
+    staffing = {
+        "PROVNUM": ccns[rows],
+        "PROVNAME": names[rows],
+        "CITY": "Springfield",
+        "STATE": states[rows],
+        "COUNTY_NAME": "County",
+        "COUNTY_FIPS": 1,
+        "CY_Qtr": "2024Q2",
+        "WorkDate": np.tile(dates, providers),
+        "MDScensus": rng.integers(10, 200, len(rows)),
+    }
+    for role in ROLES:
+        for suffix in ("", "_emp", "_ctr"):
+            staffing[f"Hrs_{role}{suffix}"] = rng.random(len(rows)) * 10
+    pd.DataFrame(staffing).to_parquet(os.path.join(out_dir, "daily_nurse_staffing_target.parquet"), index=False)
+
+    pd.DataFrame({
+        "CMS Certification Number (CCN)": ccns,
+        "Provider Name": names,
+        "Provider Address": "1 Main St",
+        "City/Town": "Springfield",
+        "State": states,
+        "Average Number of Residents per Day": rng.random(providers) * 100,
+        "Number of Certified Beds": rng.integers(50, 150, providers),
+        "Reported Total Nurse Staffing Hours per Resident per Day": rng.random(providers) * 5,
+        "Reported RN Staffing Hours per Resident per Day": rng.random(providers),
+        "Reported LPN Staffing Hours per Resident per Day": rng.random(providers),
+        "Reported Nurse Aide Staffing Hours per Resident per Day": rng.random(providers) * 3,
+        "Number of Facility Reported Incidents": rng.integers(0, 5, providers),
+        "Total nursing staff turnover": rng.random(providers) * 60,
+        "Registered Nurse turnover": rng.random(providers) * 60,
+        "Processing Date": pd.Timestamp("2024-10-01").date(),
+    }).to_parquet(os.path.join(out_dir, "nh_provider_info_target.parquet"), index=False)
+
+    pd.DataFrame({
+        "CMS Certification Number (CCN)": ccns,
+        "Provider Name": names,
+        "Address Line 1": "1 Main St",
+        "City/Town": "Springfield",
+        "State": states,
+        "ZIP Code": "00000",
+        "County/Parish": "County",
+        "Telephone Number": "5550000000",
+        "CMS Region": 1,
+        "Measure Code": "S_005_02_DTC_OBS_RATE",
+        "Score": rng.random(providers) * 100,
+        "Footnote": None,
+        "Start Date": pd.Timestamp("2023-01-01").date(),
+        "End Date": pd.Timestamp("2023-12-31").date(),
+        "Measure Date Range": "01/01/2023-12/31/2023",
+    }).to_parquet(os.path.join(out_dir, "provider_quality_reporting_target.parquet"), index=False)
+
+
+def allow_overlapping_app_tests():
+    """
+    Lets AppTest runs overlap in several threads.
+
+    AppTest installs a mock Runtime as the process-wide singleton before each run and
+    clears it afterwards, so one session finishing would pull the Runtime from under the
+    others. Keep handing out the most recently installed one instead. It also switches
+    the global.appTest option on for the length of each run only, so it is set for good,
+    and compiling the script is serialized because CPython's parser is not thread-safe.
+    """
+    import threading
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    latest = []
+
+    def current(cls):
+        if cls._instance is not None:
+            latest[:] = [cls._instance]
+        return latest[0] if latest else None
+
+    def instance(cls):
+        runtime = current(cls)
+        if runtime is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return runtime
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: current(cls) is not None)
+    config.set_option("global.appTest", True)
+
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def locked_get_bytecode(self, script_path):
+        with compile_lock:
+            return get_bytecode(self, script_path)
+
+    ScriptCache.get_bytecode = locked_get_bytecode
+
+
+class Session:
+    """One simulated analyst: an AppTest instance plus the group and tab it is looking at."""
+
+    def __init__(self, seed):
+        from streamlit.testing.v1 import AppTest
+
+        self.rng = random.Random(seed)
+        self.at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=600)
+        self.group = "Staffing Metrics"
+        self.tabs = {group: tabs[0] for group, (_, tabs) in GROUPS.items()}
+        self.timings = []
+        self.errors = []
+
+    def _run(self, action):
+        tab_key, _ = GROUPS[self.group]
+        # AppTest does not keep the open tab between runs, so it is set before every run.
+        self.at.session_state[tab_key] = self.tabs[self.group]
+        start = time.perf_counter()
+        self.at.run()
+        self.timings.append((action, time.perf_counter() - start))
+        self.errors.extend(f"{action}: {e.value}" for e in self.at.exception)
+
+    def open(self):
+        self._run("open_app")
+
+    def step(self):
+        tab = self.tabs[self.group]
+        actions = ["switch_group", "switch_tab", "switch_tab"]
+        if self.group == "Staffing Metrics" and tab in FILTER_TABS:
+            actions += ["filter_states", "filter_states", "pick_providers"]
+        action = self.rng.choice(actions)
+
+        if action == "switch_group":
+            self.group = next(group for group in GROUPS if group != self.group)
+            self.at.sidebar.radio[0].set_value(self.group)
+        elif action == "switch_tab":
+            _, tabs = GROUPS[self.group]
+            self.tabs[self.group] = self.rng.choice([t for t in tabs if t != tab])
+        elif action == "filter_states":
+            states = self.at.multiselect(key=f"{FILTER_TABS[tab]}_states")
+            states.set_value(self.rng.sample(states.options, self.rng.randint(1, min(3, len(states.options)))))
+        else:
+            prefix = f"{FILTER_TABS[tab]}_providers"
+            all_providers = self.at.checkbox(key=f"{prefix}_all")
+            if all_providers.value:
+                # Unticking "All providers" shows the search and multiselect on the next run.
+                all_providers.uncheck()
+                self._run("pick_providers")
+            providers = self.at.multiselect(key=f"{prefix}_multiselect")
+            providers.set_value(self.rng.sample(providers.options, min(3, len(providers.options))))
+        self._run(action)
+
+
+def run_session(seed, interactions):
+    session = Session(seed)
+    session.open()
+    for _ in range(interactions):
+        if session.errors:
+            break
+        session.step()
+    return session
+
+
+def summarize(sessions, wall_seconds, config):
+    from query_log import get_query_log
+
+    timings = pd.DataFrame([t for s in sessions for t in s.timings], columns=["action", "seconds"])
+    events = get_query_log().frame()
+    queries = events[events["kind"] == "query"] if not events.empty else events
+    results = {
+        "config": config,
+        "interactions": len(timings),
+        "wall_seconds": round(wall_seconds, 3),
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "warehouse_queries": len(queries),
+        "latency": {},
+    }
+    for action, seconds in timings.groupby("action")["seconds"]:
+        results["latency"][action] = {
+            "count": int(seconds.count()),
+            "p50": round(float(seconds.quantile(0.5)), 4),
+            "p95": round(float(seconds.quantile(0.95)), 4),
+            "p99": round(float(seconds.quantile(0.99)), 4),
+        }
+    return results
+
+
+def tracked_numbers(results):
+    """Flattens the numbers that are compared with the baseline."""
+    numbers = {"peak_rss_mb": results["peak_rss_mb"], "warehouse_queries": results["warehouse_queries"]}
+    for action, latency in results["latency"].items():
+        # p95 and p99 are reported, but over a few dozen interactions they are too noisy to gate on.
+        numbers[f"{action}.p50"] = latency["p50"]
+    return numbers
+
+
+def regressions(results, baseline, tolerance):
+    current = tracked_numbers(results)
+    return [
+        f"{name}: {current[name]} > {limit} (baseline) + {tolerance:.0%}"
+        for name, limit in tracked_numbers(baseline).items()
+        if name in current and current[name] > limit * (1 + tolerance)
+    ]
+
+
+def print_report(results):
+    print(f"{results['interactions']} interactions in {results['wall_seconds']}s, "
+          f"peak RSS {results['peak_rss_mb']} MB, {results['warehouse_queries']} warehouse queries")
+    print(f"{'interaction':16} {'count':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}")
+    for action, latency in sorted(results["latency"].items()):
+        print(f"{action:16} {latency['count']:>6} {latency['p50']:>8.3f} {latency['p95']:>8.3f} {latency['p99']:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--interactions", type=int, default=20, help="interactions per session")
+    parser.add_argument("--providers", type=int, default=1500, help="providers in the synthetic data")
+    parser.add_argument("--days", type=int, default=91, help="WorkDates per provider in the synthetic data")
+    parser.add_argument("--data-dir", help="use these Parquet snapshots instead of synthetic data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed regression over the baseline")
+    parser.add_argument("--write-baseline", action="store_true", help="save this run as the new baseline")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="dashboard_load_test_")
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = os.path.join(work_dir, "snapshots")
+        os.makedirs(data_dir)
+        write_synthetic_snapshots(data_dir, args.providers, args.days, args.seed)
+
+    # Read by the app's modules at import time, so set before anything imports them.
+    os.environ["DASHBOARD_BACKEND"] = "local"
+    os.environ["DASHBOARD_LOCAL_DATA_DIR"] = data_dir
+    os.environ["DASHBOARD_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    sys.path.insert(0, APP_DIR)
+    allow_overlapping_app_tests()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        sessions = list(executor.map(
+            lambda i: run_session(args.seed * 1000 + i, args.interactions), range(args.sessions)
+        ))
+    config = {
+        "sessions": args.sessions,
+        "interactions": args.interactions,
+        "data": args.data_dir or f"synthetic:{args.providers}x{args.days}",
+        "seed": args.seed,
+    }
+    results = summarize(sessions, time.perf_counter() - start, config)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = [error for session in sessions for error in session.errors]
+    for error in failures:
+        print(f"ERROR {error}")
+    if args.write_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = []
+        if baseline.get("config") != config:
+            print(f"Baseline was recorded with {baseline.get('config')}; not comparing.")
+        else:
+            regressed = regressions(results, baseline, args.tolerance)
+        for regression in regressed:
+            print(f"REGRESSION {regression}")
+        failures += regressed
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
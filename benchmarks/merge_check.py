@@ -0,0 +1,361 @@
+"""
+Local stand-in for the target MERGE tasks of the snowflake_setup pipelines, run with DuckDB.
+
+Loads batches into a staging table and an emulated append-only stream on it, and after
+each batch runs the pipeline's target MERGE statement from its snowflake_setup script,
+unchanged. DuckDB's profiler reports the rows each run read from every table, so the
+report shows whether a run's cost follows the size of the batch or the history behind it.
+
+    python benchmarks/merge_check.py
+    python benchmarks/merge_check.py --pipeline provider_info --providers 15000 --batches 24
+
+Pipelines:
+  provider_info   nh_provider_info.py; one batch per monthly drop, keyed on CCN and Processing Date
+  daily_staffing  daily_nurse_staffing.py; one batch per quarter of PBJ days, keyed on PROVNUM and WorkDate
+
+Every batch re-sends some rows with revised values, and the last run corrects part of
+the first batch. Exits with status 1 when a run read the staging history, read its change
+rows more than twice, or read more of the target than --max-target-rows; or when the
+target does not end up with one row per key holding the last values loaded.
+"""
+import argparse
+import ast
+import datetime
+import json
+import os
+import sys
+import tempfile
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+SETUP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snowflake_setup")
+
+STATES = ["CA", "FL", "IL", "NY", "OH", "PA", "TX"]
+ROLES = ["RNDON", "RNadmin", "RN", "LPNadmin", "LPN", "CNA", "NAtrn", "MedAide"]
+
+# Rows per DuckDB row group, the unit its scans skip by min/max, like a micro-partition.
+ROW_GROUP_ROWS = 122_880
+
+# Columns an append-only Snowflake stream adds to the rows of its table.
+STREAM_COLUMNS = {
+    "METADATA$ACTION": "VARCHAR",
+    "METADATA$ISUPDATE": "BOOLEAN",
+    "METADATA$ROW_ID": "VARCHAR",
+}
+
+# Columns the raw pipes record with every row loaded, carried into the staging table and
+# its stream but not the target: the load order the MERGE keeps the last row by.
+LOAD_ORDER_COLUMNS = {
+    "SOURCE_FILE": "VARCHAR",
+    "SOURCE_FILE_ROW": "BIGINT",
+    "LOADED_AT": "TIMESTAMP WITH TIME ZONE",
+}
+
+# Columns of the staging and target tables, as created by the setup scripts.
+PROVIDER_INFO_COLUMNS = {
+    "CMS Certification Number (CCN)": "VARCHAR",
+    "Provider Name": "VARCHAR",
+    "Provider Address": "VARCHAR",
+    "City/Town": "VARCHAR",
+    "State": "VARCHAR",
+    "Average Number of Residents per Day": "DOUBLE",
+    "Number of Certified Beds": "INTEGER",
+    "Reported Total Nurse Staffing Hours per Resident per Day": "DOUBLE",
+    "Reported RN Staffing Hours per Resident per Day": "DOUBLE",
+    "Reported LPN Staffing Hours per Resident per Day": "DOUBLE",
+    "Reported Nurse Aide Staffing Hours per Resident per Day": "DOUBLE",
+    "Number of Facility Reported Incidents": "INTEGER",
+    "Total nursing staff turnover": "DOUBLE",
+    "Registered Nurse turnover": "DOUBLE",
+    "Processing Date": "DATE",
+}
+DAILY_STAFFING_COLUMNS = {
+    "PROVNUM": "VARCHAR",
+    "PROVNAME": "VARCHAR",
+    "CITY": "VARCHAR",
+    "STATE": "VARCHAR",
+    "COUNTY_NAME": "VARCHAR",
+    "COUNTY_FIPS": "INTEGER",
+    "CY_Qtr": "VARCHAR",
+    "WorkDate": "DATE",
+    "MDScensus": "INTEGER",
+    **{f"Hrs_{role}{suffix}": "DOUBLE" for role in ROLES for suffix in ("", "_emp", "_ctr")},
+}
+
+
+def provider_info_batch(rng, providers, batch, resent):
+    """One monthly drop: a row per provider, then `resent` providers again with revised values."""
+    processing_date = (pd.Timestamp("2023-01-01") + pd.DateOffset(months=batch)).date()
+    ids = np.concatenate([np.arange(providers), rng.choice(providers, resent, replace=False)])
+    return pd.DataFrame({
+        "CMS Certification Number (CCN)": [f"{100000 + i}" for i in ids],
+        "Provider Name": [f"Nursing Home {i}" for i in ids],
+        "Provider Address": "1 Main St",
+        "City/Town": "Springfield",
+        "State": np.array(STATES)[ids % len(STATES)],
+        "Average Number of Residents per Day": rng.random(len(ids)) * 150,
+        "Number of Certified Beds": rng.integers(50, 250, len(ids)).astype("int32"),
+        "Reported Total Nurse Staffing Hours per Resident per Day": rng.random(len(ids)) * 5,
+        "Reported RN Staffing Hours per Resident per Day": rng.random(len(ids)),
+        "Reported LPN Staffing Hours per Resident per Day": rng.random(len(ids)),
+        "Reported Nurse Aide Staffing Hours per Resident per Day": rng.random(len(ids)) * 3,
+        "Number of Facility Reported Incidents": rng.integers(0, 5, len(ids)).astype("int32"),
+        "Total nursing staff turnover": rng.random(len(ids)) * 100,
+        "Registered Nurse turnover": rng.random(len(ids)) * 100,
+        "Processing Date": processing_date,
+    })
+
+
+def provider_info_correction(rng, providers, resent):
+    """A late correction to a tenth of the providers in the first drop."""
+    return provider_info_batch(rng, providers, 0, resent).iloc[: providers // 10]
+
+
+def daily_staffing_batch(rng, providers, batch, resent):
+    """One quarter of PBJ rows: a row per provider and day, then `resent` provider-days again with revised hours."""
+    start = pd.Timestamp("2023-01-01") + pd.DateOffset(months=3 * batch)
+    dates = pd.date_range(start, start + pd.DateOffset(months=3) - pd.Timedelta(days=1)).date
+    rows = np.arange(providers * len(dates))
+    rows = np.concatenate([rows, rng.choice(len(rows), resent * len(dates), replace=False)])
+    ids = rows // len(dates)
+    df = pd.DataFrame({
+        "PROVNUM": [f"{100000 + i}" for i in ids],
+        "PROVNAME": [f"Nursing Home {i}" for i in ids],
+        "CITY": "Springfield",
+        "STATE": np.array(STATES)[ids % len(STATES)],
+        "COUNTY_NAME": "County",
+        "COUNTY_FIPS": np.int32(1),
+        "CY_Qtr": f"{start.year}Q{start.quarter}",
+        "WorkDate": dates[rows % len(dates)],
+        "MDScensus": rng.integers(10, 200, len(rows)).astype("int32"),
+    })
+    for role in ROLES:
+        for suffix in ("", "_emp", "_ctr"):
+            df[f"Hrs_{role}{suffix}"] = rng.random(len(rows)) * 10
+    return df
+
+
+def daily_staffing_correction(rng, providers, resent):
+    """A late correction to the first week of the first quarter."""
+    batch = daily_staffing_batch(rng, providers, 0, resent)
+    return batch[batch["WorkDate"] < datetime.date(2023, 1, 8)]
+
+
+# Pipeline -> its setup script, MERGE constant, tables, key, a column to verify and its batches.
+PIPELINES = {
+    "provider_info": {
+        "script": "nh_provider_info.py",
+        "statement": "PROVIDER_INFO_TARGET_MERGE",
+        "staging": "healthcare.staging.nh_provider_info_staging",
+        "stream": "healthcare.staging.provider_info_staging_stream",
+        "target": "healthcare.public.nh_provider_info_target",
+        "columns": PROVIDER_INFO_COLUMNS,
+        "keys": ["CMS Certification Number (CCN)", "Processing Date"],
+        "value": "Average Number of Residents per Day",
+        "batch": provider_info_batch,
+        "correction": provider_info_correction,
+    },
+    "daily_staffing": {
+        "script": "daily_nurse_staffing.py",
+        "statement": "DAILY_STAFFING_TARGET_MERGE",
+        "staging": "healthcare.staging.daily_nurse_staffing_staging",
+        "stream": "healthcare.staging.daily_nurse_staffing_staging_stream",
+        "target": "healthcare.public.daily_nurse_staffing_target",
+        "columns": DAILY_STAFFING_COLUMNS,
+        "keys": ["PROVNUM", "WorkDate"],
+        "value": "Hrs_CNA",
+        "batch": daily_staffing_batch,
+        "correction": daily_staffing_correction,
+    },
+}
+
+
+def setup_statement(script, name):
+    """Returns the string constant `name` from a snowflake_setup script without running the script."""
+    path = os.path.join(SETUP_DIR, script)
+    with open(path) as f:
+        module = ast.parse(f.read())
+    for node in module.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == name for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise LookupError(f"{name} is not defined in {path}")
+
+
+def column_list(columns):
+    return ", ".join(f'"{name}" {column_type}' for name, column_type in columns.items())
+
+
+def create_pipeline(con, pipeline):
+    """Creates the staging table, the stream stand-in and the target in a `healthcare` database."""
+    con.execute("ATTACH ':memory:' AS healthcare")
+    # Unqualified schemas resolve in HEALTHCARE, the database the setup scripts connect to.
+    con.execute("USE healthcare")
+    con.execute("CREATE SCHEMA healthcare.staging")
+    con.execute("CREATE SCHEMA healthcare.public")
+    staging_columns = {**pipeline['columns'], **LOAD_ORDER_COLUMNS}
+    con.execute(f"CREATE TABLE {pipeline['staging']} ({column_list(staging_columns)})")
+    con.execute(f"CREATE TABLE {pipeline['target']} ({column_list(pipeline['columns'])})")
+    # The stream holds exactly the rows added since its offset, as a Snowflake stream does.
+    con.execute(f"CREATE TABLE {pipeline['stream']} ({column_list({**staging_columns, **STREAM_COLUMNS})})")
+
+
+def load(con, pipeline, batch, load_number):
+    """
+    Appends a batch to the staging table and, with stream metadata, to the stream, as one
+    file loaded at its own time with its rows numbered in file order.
+    """
+    batch = batch.assign(
+        SOURCE_FILE=f"drop_{load_number:06d}.csv",
+        SOURCE_FILE_ROW=np.arange(1, len(batch) + 1),
+        LOADED_AT=pd.Timestamp("2024-01-01", tz="UTC") + pd.Timedelta(hours=load_number),
+    )
+    con.register("load_batch", batch)
+    con.execute(f"INSERT INTO {pipeline['staging']} SELECT * FROM load_batch")
+    # Snowflake's row ids are opaque, so they are random here: the MERGE must not rely on them.
+    con.execute(f"INSERT INTO {pipeline['stream']} SELECT *, 'INSERT', FALSE, uuid()::VARCHAR FROM load_batch")
+    con.unregister("load_batch")
+
+
+def rows_scanned(profile):
+    """Sums the rows each table scan in a DuckDB JSON profile read, per table."""
+    scanned = {}
+    nodes = [profile]
+    while nodes:
+        node = nodes.pop()
+        if node.get("operator_type") == "TABLE_SCAN":
+            table = node.get("extra_info", {}).get("Table", "?")
+            scanned[table] = scanned.get(table, 0) + int(node.get("operator_rows_scanned", 0))
+        nodes.extend(node.get("children", []))
+    return scanned
+
+
+def run_merge(con, pipeline, merge):
+    """Runs the MERGE and consumes the stream in one transaction; returns rows scanned per table."""
+    with tempfile.TemporaryDirectory(prefix="merge_check_") as profile_dir:
+        profile_path = os.path.join(profile_dir, "profile.json")
+        con.execute("BEGIN TRANSACTION")
+        con.execute("PRAGMA enable_profiling = 'json'")
+        con.execute(f"PRAGMA profiling_output = '{profile_path}'")
+        con.execute(merge)
+        con.execute("PRAGMA disable_profiling")
+        # Committing the statement that read a stream is what advances the stream's offset.
+        # The stream is recreated rather than emptied so its statistics describe only the
+        # next batch, as a stream's do, rather than every batch it ever held.
+        con.execute(f"CREATE OR REPLACE TABLE {pipeline['stream']} AS FROM {pipeline['stream']} LIMIT 0")
+        con.execute("COMMIT")
+        with open(profile_path) as f:
+            scanned = rows_scanned(json.load(f))
+    return {table.split(".")[-1]: rows for table, rows in scanned.items()}
+
+
+def row_groups_in_range(con, pipeline, batch):
+    """
+    Returns the rows in the target's row groups that hold a date in the range of `batch`:
+    what a MERGE that prunes the target on the batch's dates still has to read.
+    """
+    date = pipeline["keys"][-1]
+    groups = con.execute(
+        f'SELECT COUNT(DISTINCT rowid // {ROW_GROUP_ROWS}) FROM {pipeline["target"]} WHERE "{date}" BETWEEN ? AND ?',
+        [batch[date].min(), batch[date].max()],
+    ).fetchone()[0]
+    return groups * ROW_GROUP_ROWS
+
+
+def check_pipeline(name, args):
+    """Runs every batch of pipeline `name` through its MERGE; returns the failures found."""
+    pipeline = PIPELINES[name]
+    merge = setup_statement(pipeline["script"], pipeline["statement"])
+    rng = np.random.default_rng(args.seed)
+    con = duckdb.connect()
+    create_pipeline(con, pipeline)
+    resent = int(args.providers * args.resent)
+    batches = [pipeline["batch"](rng, args.providers, batch, resent) for batch in range(args.batches)]
+    # A late correction to part of the first batch, which the MERGE has to update in place.
+    batches.append(pipeline["correction"](rng, args.providers, resent))
+    staging_name, stream_name, target_name = (pipeline[table].split(".")[-1] for table in ("staging", "stream", "target"))
+
+    failures = []
+    print(f"\n{name}: {pipeline['statement']} from snowflake_setup/{pipeline['script']}")
+    print(f"{'run':>4} {'batch rows':>11} {'staging rows':>13} {'stream read':>12} {'staging read':>13} {'target read':>12} {'target rows':>12}")
+    for run, batch in enumerate(batches, start=1):
+        # A batch that corrects earlier dates has to read the row groups holding them; any
+        # other batch may read one row group, however much history the target holds.
+        max_target_rows = args.max_target_rows or (
+            2 * len(batch) + max(ROW_GROUP_ROWS, row_groups_in_range(con, pipeline, batch))
+        )
+        load(con, pipeline, batch, run)
+        scanned = run_merge(con, pipeline, merge)
+        staging_rows = con.execute(f"SELECT COUNT(*) FROM {pipeline['staging']}").fetchone()[0]
+        target_rows = con.execute(f"SELECT COUNT(*) FROM {pipeline['target']}").fetchone()[0]
+        stream_read = scanned.get(stream_name, 0)
+        staging_read = scanned.get(staging_name, 0)
+        target_read = scanned.get(target_name, 0)
+        print(f"{run:>4} {len(batch):>11,} {staging_rows:>13,} {stream_read:>12,} {staging_read:>13,} {target_read:>12,} {target_rows:>12,}")
+        if staging_read:
+            failures.append(f"{name} run {run} read {staging_read:,} rows of the staging history")
+        # DuckDB plans the deduplication as an aggregate joined back to the change rows, so
+        # it reads them twice.
+        if stream_read > 2 * len(batch):
+            failures.append(f"{name} run {run} read {stream_read:,} change rows for a batch of {len(batch):,}")
+        if target_read > max_target_rows:
+            failures.append(f"{name} run {run} read {target_read:,} target rows (limit {max_target_rows:,})")
+
+    # The target must hold one row per key, with the last values loaded for it.
+    keys = pipeline["keys"]
+    key_list = ", ".join(f'"{key}"' for key in keys)
+    duplicates = con.execute(f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM {pipeline['target']}
+            GROUP BY {key_list}
+            HAVING COUNT(*) > 1
+        )
+    """).fetchone()[0]
+    expected = pd.concat(batches, ignore_index=True).drop_duplicates(keys, keep="last")
+    target = con.execute(f"SELECT * FROM {pipeline['target']}").df()
+    for frame in (expected, target):
+        frame[keys[-1]] = pd.to_datetime(frame[keys[-1]])
+    merged = expected.merge(target, on=keys, how="outer", suffixes=("", "_target"), indicator=True)
+    missing = int((merged["_merge"] != "both").sum())
+    value = pipeline["value"]
+    stale = int((merged["_merge"] == "both").sum() - np.isclose(merged[value], merged[f"{value}_target"]).sum())
+    if duplicates or missing or stale:
+        failures.append(
+            f"{name} target has {duplicates:,} duplicated keys, {missing:,} missing or extra rows "
+            f"and {stale:,} rows not holding the last values loaded"
+        )
+    con.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the target MERGE tasks only read each new batch.")
+    parser.add_argument("--pipeline", choices=list(PIPELINES), action="append", help="Defaults to every pipeline.")
+    parser.add_argument("--providers", type=int, default=2000)
+    parser.add_argument("--batches", type=int, default=12)
+    parser.add_argument("--resent", type=float, default=0.01, help="Share of providers delivered twice per batch.")
+    parser.add_argument(
+        "--max-target-rows", type=int, default=None,
+        help=(
+            "Target rows a run may read; defaults to twice the batch size plus the DuckDB row groups "
+            "holding the batch's dates, or one row group when none do."
+        ),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.pipeline or list(PIPELINES):
+        failures.extend(check_pipeline(name, args))
+
+    print()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: every run read only its own batch, and each target holds the last row loaded per key.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
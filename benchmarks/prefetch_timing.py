@@ -0,0 +1,126 @@
+"""
+Checks that each dashboard tab fetches its datasets concurrently, run headlessly with
+Streamlit's AppTest against the local DuckDB backend.
+
+Every query is delayed by --delay seconds to stand in for warehouse latency. Each tab
+is opened once with cold caches, and the time from the start of its first dataset
+query to the end of its last is compared with the slowest of those queries: fetched
+together they take about as long as the slowest one, fetched one after the other as
+long as all of them.
+
+    python benchmarks/prefetch_timing.py
+    python benchmarks/prefetch_timing.py --delay 1.0 --providers 5000
+
+Exits with status 1 when a tab with several datasets took more than --tolerance past
+its slowest query, or when a tab raised an exception.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from load_test import APP_DIR, GROUPS, write_synthetic_snapshots
+
+
+def delay_queries(delay):
+    """Makes the local backend sleep `delay` seconds before every dataset query."""
+    import local_backend
+
+    class DelayedBackend(local_backend.LocalBackend):
+        def execute(self, query, params, tag):
+            # The source-version poll is not part of any tab's datasets.
+            if not tag.endswith(":table_versions"):
+                time.sleep(delay)
+            return super().execute(query, params, tag)
+
+    local_backend.LocalBackend = DelayedBackend
+
+
+def clear_caches(cache_dir):
+    """Drops every cached dataset, in memory and on disk, so the next tab starts cold."""
+    from dashboard_data import get_dataset_store
+
+    get_dataset_store.clear()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def open_tab(group, tab, cache_dir):
+    """
+    Opens `tab` of `group` in a new session with cold caches; returns (the time its run
+    started, the exceptions it raised).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=600)
+    tab_key, _ = GROUPS[group]
+    if group != next(iter(GROUPS)):
+        # The sidebar radio has no key, so the group is switched after a first run.
+        at.run()
+        at.sidebar.radio[0].set_value(group)
+    # AppTest does not keep the open tab between runs, so it is set right before the run.
+    at.session_state[tab_key] = tab
+    clear_caches(cache_dir)
+    started = time.time()
+    at.run()
+    return started, [e.value for e in at.exception]
+
+
+def query_timings(events, since):
+    """Returns (name, start, end) of every dataset query recorded after `since`."""
+    queries = events[(events["kind"] == "query") & (events["at"] > since) & (events["name"] != "table_versions")]
+    return [(row["name"], row["at"] - row["seconds"], row["at"]) for _, row in queries.iterrows()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds added to every query")
+    parser.add_argument("--providers", type=int, default=1500, help="providers in the synthetic data")
+    parser.add_argument("--days", type=int, default=91, help="WorkDates per provider in the synthetic data")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed excess over the slowest query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="dashboard_prefetch_timing_")
+    data_dir = os.path.join(work_dir, "snapshots")
+    cache_dir = os.path.join(work_dir, "cache")
+    os.makedirs(data_dir)
+    write_synthetic_snapshots(data_dir, args.providers, args.days, args.seed)
+
+    # Read by the app's modules at import time, so set before anything imports them.
+    os.environ["DASHBOARD_BACKEND"] = "local"
+    os.environ["DASHBOARD_LOCAL_DATA_DIR"] = data_dir
+    os.environ["DASHBOARD_CACHE_DIR"] = cache_dir
+    sys.path.insert(0, APP_DIR)
+    delay_queries(args.delay)
+    from query_log import get_query_log
+
+    failures = []
+    print(f"{'tab':45} {'queries':>7} {'slowest s':>9} {'sum s':>7} {'wall s':>7}")
+    for group, (_, tabs) in GROUPS.items():
+        for tab in tabs:
+            since, errors = open_tab(group, tab, cache_dir)
+            failures.extend(f"{tab}: {error}" for error in errors)
+            timings = query_timings(get_query_log().frame(), since)
+            if not timings:
+                failures.append(f"{tab}: no dataset queries were recorded")
+                continue
+            slowest = max(end - start for _, start, end in timings)
+            total = sum(end - start for _, start, end in timings)
+            wall = max(end for _, _, end in timings) - min(start for _, start, _ in timings)
+            print(f"{tab.strip():45} {len(timings):>7} {slowest:>9.2f} {total:>7.2f} {wall:>7.2f}")
+            if len(timings) > 1 and wall > slowest * (1 + args.tolerance):
+                names = ", ".join(name for name, _, _ in timings)
+                failures.append(f"{tab.strip()}: {names} took {wall:.2f}s against a slowest query of {slowest:.2f}s")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: every tab's datasets were fetched together.")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
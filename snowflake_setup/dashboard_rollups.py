@@ -0,0 +1,254 @@
+import snowflake.connector
+
+from cryptography.hazmat.primitives import serialization
+
+# Rollup tables the dashboard reads instead of scanning the target tables.
+#
+# Each rollup is backfilled once from its target table and then maintained from a change
+# stream on that target: every insert adds its measures to its group's row, every delete
+# subtracts them, and an update (a delete plus an insert) moves the difference. Refresh
+# cost is proportional to the rows changed by a load, not to the history the target holds.
+#
+# Run after daily_nurse_staffing.py and nh_provider_info.py; recreating a target table
+# makes its stream stale, so rerun this script whenever those are rerun.
+
+RESIDENTS = '"Average Number of Residents per Day"'
+BEDS = '"Number of Certified Beds"'
+TOTAL_STAFFING = '"Reported Total Nurse Staffing Hours per Resident per Day"'
+RN_STAFFING = '"Reported RN Staffing Hours per Resident per Day"'
+LPN_STAFFING = '"Reported LPN Staffing Hours per Resident per Day"'
+AIDE_STAFFING = '"Reported Nurse Aide Staffing Hours per Resident per Day"'
+NURSE_HOURS = '"Hrs_RNDON" + "Hrs_RNadmin" + "Hrs_LPNadmin" + "Hrs_LPN" + "Hrs_CNA" + "Hrs_NAtrn" + "Hrs_MedAide"'
+CONTRACTED_HOURS = '"Hrs_RNDON_ctr" + "Hrs_RNadmin_ctr" + "Hrs_LPNadmin_ctr" + "Hrs_LPN_ctr" + "Hrs_CNA_ctr" + "Hrs_NAtrn_ctr" + "Hrs_MedAide_ctr"'
+
+# Averages are kept as a sum and a count of non-null values, so they stay exact as rows come and go.
+STAFFING_AVERAGES = {
+    "RESIDENTS": RESIDENTS,
+    "TOTAL_STAFFING": TOTAL_STAFFING,
+    "RN_STAFFING": RN_STAFFING,
+    "LPN_STAFFING": LPN_STAFFING,
+    "AIDE_STAFFING": AIDE_STAFFING,
+}
+AVERAGE_MEASURES = {
+    **{f"{name}_SUM": ("sum", expression) for name, expression in STAFFING_AVERAGES.items()},
+    **{f"{name}_COUNT": ("count", expression) for name, expression in STAFFING_AVERAGES.items()},
+}
+
+STAFFING_HOURS = {
+    "TOTALNURSEHOURS": ("sum", NURSE_HOURS),
+    "TOTALCONTRACTEDHOURS": ("sum", CONTRACTED_HOURS),
+}
+STAFFING_PROVIDER_KEYS = {"PROVNUM": "PROVNUM", "PROVNAME": "PROVNAME", "STATE": "STATE"}
+
+# Staffing hours per provider at each time grain the Nurse Hours tab offers:
+# rollup -> (period column, expression). Weeks are ISO weeks, starting on Monday
+# (WEEK_START = 1 is set for the backfill session and the refresh task).
+STAFFING_PERIOD_ROLLUPS = {
+    "HEALTHCARE.PUBLIC.STAFFING_PROVIDER_DAY_ROLLUP": ("WORKDATE", '"WorkDate"'),
+    "HEALTHCARE.PUBLIC.STAFFING_PROVIDER_WEEK_ROLLUP": ("WORKWEEK", "DATE_TRUNC('week', \"WorkDate\")"),
+    "HEALTHCARE.PUBLIC.STAFFING_PROVIDER_MONTH_ROLLUP": ("WORKMONTH", "DATE_TRUNC('month', \"WorkDate\")"),
+    "HEALTHCARE.PUBLIC.STAFFING_PROVIDER_QUARTER_ROLLUP": ("WORKQUARTER", "DATE_TRUNC('quarter', \"WorkDate\")"),
+}
+
+# Source target table -> change stream on it, and the rollups maintained from that stream.
+# A rollup is its group-by keys (column -> expression) and its measures (column -> (sum or count, expression)).
+# "changes" optionally names a table recording when each day, as (column, expression), last changed.
+ROLLUP_SOURCES = {
+    "HEALTHCARE.PUBLIC.DAILY_NURSE_STAFFING_TARGET": {
+        "stream": "HEALTHCARE.PUBLIC.DAILY_NURSE_STAFFING_TARGET_STREAM",
+        "task": "healthcare.staging.refresh_staffing_rollups_task",
+        "after": "healthcare.staging.load_nursing_target_task",
+        # Nurse Hours tab refreshes: the days each refresh changed, to re-read only their periods.
+        "changes": ("HEALTHCARE.PUBLIC.STAFFING_DAY_CHANGES", ("WORKDATE", '"WorkDate"')),
+        "rollups": {
+            # Nurse Hours tab: hours per provider and day, week, month or quarter.
+            **{
+                rollup: {"keys": {**STAFFING_PROVIDER_KEYS, column: expression}, "measures": STAFFING_HOURS}
+                for rollup, (column, expression) in STAFFING_PERIOD_ROLLUPS.items()
+            },
+            # Provider rankings and the staffing filters: totals per provider.
+            "HEALTHCARE.PUBLIC.STAFFING_PROVIDER_ROLLUP": {
+                "keys": STAFFING_PROVIDER_KEYS,
+                "measures": STAFFING_HOURS,
+            },
+        },
+    },
+    "HEALTHCARE.PUBLIC.NH_PROVIDER_INFO_TARGET": {
+        "stream": "HEALTHCARE.PUBLIC.NH_PROVIDER_INFO_TARGET_STREAM",
+        "task": "healthcare.staging.refresh_provider_info_rollups_task",
+        "after": "healthcare.staging.provider_info_target_task",
+        "rollups": {
+            # State tab. The target keeps every monthly drop, and the dashboard reads the
+            # latest one, so every provider-info rollup is kept per month.
+            "HEALTHCARE.PUBLIC.PROVIDER_INFO_STATE_MONTH_ROLLUP": {
+                "keys": {
+                    '"State"': '"State"',
+                    '"ReportingMonth"': 'DATE_TRUNC(\'month\', "Processing Date")',
+                },
+                "measures": AVERAGE_MEASURES,
+            },
+            # Provider tab, bed utilization and staffing vs. occupancy.
+            "HEALTHCARE.PUBLIC.PROVIDER_INFO_PROVIDER_MONTH_ROLLUP": {
+                "keys": {
+                    '"Provider Name"': '"Provider Name"',
+                    '"ReportingMonth"': 'DATE_TRUNC(\'month\', "Processing Date")',
+                },
+                "measures": {
+                    **AVERAGE_MEASURES,
+                    "BEDS_SUM": ("sum", BEDS),
+                    "RESIDENT_STAFFING_HOURS_SUM": ("sum", f"{TOTAL_STAFFING} * {RESIDENTS}"),
+                },
+            },
+            # Occupancy trend by month.
+            "HEALTHCARE.PUBLIC.PROVIDER_INFO_MONTH_ROLLUP": {
+                "keys": {'"ReportingMonth"': 'DATE_TRUNC(\'month\', "Processing Date")'},
+                "measures": {
+                    "RESIDENTS_SUM": ("sum", RESIDENTS),
+                    "BEDS_SUM": ("sum", BEDS),
+                },
+            },
+        },
+    },
+}
+
+
+def backfill_sql(rollup, spec, source, stream):
+    """Builds the rollup from the target as of the stream's offset, so no change is counted twice or missed."""
+    keys = ",\n        ".join(f"{expression} AS {name}" for name, expression in spec["keys"].items())
+    measures = ",\n        ".join(
+        f"COALESCE(SUM({expression}), 0) AS {name}" if kind == "sum" else f"COUNT({expression}) AS {name}"
+        for name, (kind, expression) in spec["measures"].items()
+    )
+    return f"""
+    CREATE OR REPLACE TABLE {rollup} AS
+    SELECT
+        {keys},
+        {measures},
+        COUNT(*) AS ROW_COUNT
+    FROM {source} AT(STREAM => '{stream}')
+    GROUP BY {", ".join(spec["keys"])};
+    """
+
+
+def merge_sql(rollup, spec, stream):
+    """Folds the stream's net change per group into the rollup, dropping groups left with no rows."""
+    keys = list(spec["keys"])
+    delta_keys = ",\n            ".join(f"{expression} AS {name}" for name, expression in spec["keys"].items())
+    delta_measures = ",\n            ".join(
+        f"SUM(CHANGE_SIGN * ({expression})) AS {name}" if kind == "sum"
+        else f"SUM(IFF(({expression}) IS NULL, 0, CHANGE_SIGN)) AS {name}"
+        for name, (kind, expression) in spec["measures"].items()
+    )
+    columns = [*spec["measures"], "ROW_COUNT"]
+    matched = " AND ".join(f"EQUAL_NULL(target.{key}, delta.{key})" for key in keys)
+    updates = ",\n        ".join(
+        f"{column} = target.{column} + COALESCE(delta.{column}, 0)" for column in columns
+    )
+    insert_columns = ", ".join([*keys, *columns])
+    insert_values = ", ".join([f"delta.{key}" for key in keys] + [f"COALESCE(delta.{column}, 0)" for column in columns])
+    return f"""
+    MERGE INTO {rollup} AS target
+    USING (
+        SELECT
+            {delta_keys},
+            {delta_measures},
+            SUM(CHANGE_SIGN) AS ROW_COUNT
+        FROM (
+            SELECT *, IFF(METADATA$ACTION = 'INSERT', 1, -1) AS CHANGE_SIGN
+            FROM {stream}
+        )
+        GROUP BY {", ".join(keys)}
+    ) AS delta
+    ON {matched}
+    WHEN MATCHED AND target.ROW_COUNT + delta.ROW_COUNT = 0 THEN DELETE
+    WHEN MATCHED THEN UPDATE SET
+        {updates}
+    WHEN NOT MATCHED AND delta.ROW_COUNT > 0 THEN INSERT ({insert_columns})
+    VALUES ({insert_values});
+    """
+
+
+def changes_backfill_sql(changes, spec, source, stream):
+    """Marks every day the backfill covered as changed now."""
+    column, expression = spec
+    return f"""
+    CREATE OR REPLACE TABLE {changes} AS
+    SELECT DISTINCT
+        {expression} AS {column},
+        DATE_PART(EPOCH_SECOND, CURRENT_TIMESTAMP()) AS CHANGED_AT
+    FROM {source} AT(STREAM => '{stream}');
+    """
+
+
+def changes_merge_sql(changes, spec, stream):
+    """
+    Records when each day in the stream last changed, as epoch seconds. Readers compare
+    against their own clock, so they allow for skew and for refreshes still committing.
+    """
+    column, expression = spec
+    return f"""
+    MERGE INTO {changes} AS target
+    USING (
+        SELECT DISTINCT {expression} AS {column}
+        FROM {stream}
+    ) AS delta
+    ON target.{column} = delta.{column}
+    WHEN MATCHED THEN UPDATE SET
+        CHANGED_AT = DATE_PART(EPOCH_SECOND, CURRENT_TIMESTAMP())
+    WHEN NOT MATCHED THEN INSERT ({column}, CHANGED_AT)
+    VALUES (delta.{column}, DATE_PART(EPOCH_SECOND, CURRENT_TIMESTAMP()));
+    """
+
+
+# Load your private key
+with open("/Users/manupriyaarora/rsa_private_key.pem", "rb") as key_file:
+    p_key = serialization.load_pem_private_key(
+        key_file.read(),
+        password=None
+    )
+
+conn = snowflake.connector.connect(
+    user='MANUSNOWFLAKE',
+    account='MWOPCMB-JC54670',
+    private_key=p_key,
+    warehouse='COMPUTE_WH',
+    database='HEALTHCARE',
+    schema='PUBLIC'
+)
+cursor = conn.cursor()
+cursor.execute("ALTER SESSION SET WEEK_START = 1;")
+
+for source, pipeline in ROLLUP_SOURCES.items():
+    # A standard (not append-only) stream, so that rows the target MERGE updates are
+    # reported as a delete of the old values plus an insert of the new ones.
+    cursor.execute(f"""
+    CREATE OR REPLACE STREAM {pipeline["stream"]}
+    ON TABLE {source};
+    """)
+    for rollup, spec in pipeline["rollups"].items():
+        print(f"Backfilling {rollup}")
+        cursor.execute(backfill_sql(rollup, spec, source, pipeline["stream"]))
+
+    # Every rollup of a source reads the same change rows: the stream's offset only
+    # advances when the transaction that consumed it commits.
+    merges = "\n".join(merge_sql(rollup, spec, pipeline["stream"]) for rollup, spec in pipeline["rollups"].items())
+    if "changes" in pipeline:
+        changes, spec = pipeline["changes"]
+        print(f"Backfilling {changes}")
+        cursor.execute(changes_backfill_sql(changes, spec, source, pipeline["stream"]))
+        merges += changes_merge_sql(changes, spec, pipeline["stream"])
+    cursor.execute(f"""
+    CREATE OR REPLACE TASK {pipeline["task"]}
+    WAREHOUSE = 'compute_wh'
+    WEEK_START = 1
+    AFTER {pipeline["after"]}
+    WHEN SYSTEM$STREAM_HAS_DATA('{pipeline["stream"]}')
+    AS
+    BEGIN
+        BEGIN TRANSACTION;
+        {merges}
+        COMMIT;
+    END;
+    """)
+cursor.close()
+conn.close()
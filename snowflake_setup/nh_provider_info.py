@@ -4,6 +4,76 @@ from io import StringIO
 
 from cryptography.hazmat.primitives import serialization
 
+# Merges the provider info loaded since the last run into the target, one row per
+# provider (CCN) and monthly drop (Processing Date). Reading the stream rather than the
+# staging table keeps each run proportional to the new drop, and consuming the stream
+# in the MERGE is what advances its offset. benchmarks/merge_check.py runs this
+# statement against a local stand-in of the pipeline.
+PROVIDER_INFO_TARGET_MERGE = """
+MERGE INTO healthcare.public.nh_provider_info_target AS target
+USING (
+    -- Only the rows loaded since the last run. A provider can appear more than once in a
+    -- drop (e.g. a file delivered twice); the last row loaded for a CCN and date wins,
+    -- by the load time, file and line recorded when the raw file was copied in.
+    SELECT *
+    FROM healthcare.staging.provider_info_staging_stream
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY "CMS Certification Number (CCN)", "Processing Date"
+        ORDER BY "LOADED_AT" DESC, "SOURCE_FILE" DESC, "SOURCE_FILE_ROW" DESC
+    ) = 1
+) AS source
+ON target."CMS Certification Number (CCN)" = source."CMS Certification Number (CCN)"
+AND target."Processing Date" = source."Processing Date"
+WHEN MATCHED THEN UPDATE SET
+    "Provider Name" = source."Provider Name",
+    "Provider Address" = source."Provider Address",
+    "City/Town" = source."City/Town",
+    "State" = source."State",
+    "Average Number of Residents per Day" = source."Average Number of Residents per Day",
+    "Number of Certified Beds" = source."Number of Certified Beds",
+    "Reported Total Nurse Staffing Hours per Resident per Day" = source."Reported Total Nurse Staffing Hours per Resident per Day",
+    "Reported RN Staffing Hours per Resident per Day" = source."Reported RN Staffing Hours per Resident per Day",
+    "Reported LPN Staffing Hours per Resident per Day" = source."Reported LPN Staffing Hours per Resident per Day",
+    "Reported Nurse Aide Staffing Hours per Resident per Day" = source."Reported Nurse Aide Staffing Hours per Resident per Day",
+    "Number of Facility Reported Incidents" = source."Number of Facility Reported Incidents",
+    "Total nursing staff turnover" = source."Total nursing staff turnover",
+    "Registered Nurse turnover" = source."Registered Nurse turnover"
+WHEN NOT MATCHED THEN INSERT (
+    "CMS Certification Number (CCN)",
+    "Provider Name",
+    "Provider Address",
+    "City/Town",
+    "State",
+    "Average Number of Residents per Day",
+    "Number of Certified Beds",
+    "Reported Total Nurse Staffing Hours per Resident per Day",
+    "Reported RN Staffing Hours per Resident per Day",
+    "Reported LPN Staffing Hours per Resident per Day",
+    "Reported Nurse Aide Staffing Hours per Resident per Day",
+    "Number of Facility Reported Incidents",
+    "Total nursing staff turnover",
+    "Registered Nurse turnover",
+    "Processing Date"
+)
+VALUES (
+    source."CMS Certification Number (CCN)",
+    source."Provider Name",
+    source."Provider Address",
+    source."City/Town",
+    source."State",
+    source."Average Number of Residents per Day",
+    source."Number of Certified Beds",
+    source."Reported Total Nurse Staffing Hours per Resident per Day",
+    source."Reported RN Staffing Hours per Resident per Day",
+    source."Reported LPN Staffing Hours per Resident per Day",
+    source."Reported Nurse Aide Staffing Hours per Resident per Day",
+    source."Number of Facility Reported Incidents",
+    source."Total nursing staff turnover",
+    source."Registered Nurse turnover",
+    source."Processing Date"
+);
+"""
+
 # Load your private key
 with open("/Users/manupriyaarora/rsa_private_key.pem", "rb") as key_file:
     p_key = serialization.load_pem_private_key(
@@ -29,17 +99,26 @@ with open(file_path, 'r') as f:
 
 columns = ', '.join([f'"{h}" STRING' for h in headers])  # Quote column names
 print(f"List all columns: {columns}")
+# Every raw row also records when it was loaded and the file and line it came from, the
+# load order the target MERGE uses to keep the last row delivered for a provider.
 cursor.execute(f"""
     CREATE OR REPLACE TABLE nh_provider_info (
-        {columns}
+        {columns},
+        "SOURCE_FILE" STRING,
+        "SOURCE_FILE_ROW" NUMBER,
+        "LOADED_AT" TIMESTAMP_LTZ
     )
 """)
-cursor.execute("""
+fields = ', '.join([f'${i}' for i in range(1, len(headers) + 1)])
+cursor.execute(f"""
 CREATE OR REPLACE PIPE nh_provider_info_raw_pipe
   AUTO_INGEST = TRUE
 AS
 COPY INTO nh_provider_info
-FROM @S3_stage/NH_ProviderInfo_Oct2024.csv
+FROM (
+    SELECT {fields}, METADATA$FILENAME, METADATA$FILE_ROW_NUMBER, METADATA$START_SCAN_TIME
+    FROM @S3_stage/NH_ProviderInfo_Oct2024.csv
+)
 FILE_FORMAT = csv_no_header;
 """)
 cursor.execute("""
@@ -58,9 +137,14 @@ CREATE OR REPLACE TABLE staging.nh_provider_info_staging (
   "Number of Facility Reported Incidents" INT,
   "Total nursing staff turnover" FLOAT, 
   "Registered Nurse turnover" FLOAT,
-  "Processing Date" DATE
+  "Processing Date" DATE,
+  "SOURCE_FILE" VARCHAR,
+  "SOURCE_FILE_ROW" NUMBER,
+  "LOADED_AT" TIMESTAMP_LTZ
 );  
 """)
+# Clustered by monthly drop: the dashboard ranks providers in the latest "Processing
+# Date", and the target MERGE joins on it.
 cursor.execute("""
 CREATE OR REPLACE TABLE public.nh_provider_info_target (
   "CMS Certification Number (CCN)" VARCHAR, 
@@ -78,7 +162,8 @@ CREATE OR REPLACE TABLE public.nh_provider_info_target (
   "Total nursing staff turnover" FLOAT, 
   "Registered Nurse turnover" FLOAT,
   "Processing Date" DATE
-); 
+)
+CLUSTER BY ("Processing Date");
 """)
 cursor.execute("""
 CREATE OR REPLACE STREAM HEALTHCARE.RAW.provider_info_raw_stream
@@ -90,71 +175,20 @@ CREATE OR REPLACE TASK healthcare.staging.load_provider_info_staging_task
 WAREHOUSE = 'compute_wh' 
 SCHEDULE = '5 MINUTE' 
 WHEN SYSTEM$STREAM_HAS_DATA('healthcare.raw.provider_info_raw_stream') AS 
-INSERT INTO healthcare.staging.nh_provider_info_staging ("CMS Certification Number (CCN)", "Provider Name", "Provider Address", "City/Town", "State", "Average Number of Residents per Day", "Number of Certified Beds", "Reported Total Nurse Staffing Hours per Resident per Day", "Reported RN Staffing Hours per Resident per Day", "Reported LPN Staffing Hours per Resident per Day", "Reported Nurse Aide Staffing Hours per Resident per Day", "Number of Facility Reported Incidents", "Total nursing staff turnover", "Registered Nurse turnover", "Processing Date") SELECT "CMS Certification Number (CCN)", "Provider Name", "Provider Address", "City/Town", "State", TRY_CAST("Average Number of Residents per Day" AS FLOAT), TRY_CAST("Number of Certified Beds" AS INTEGER), TRY_CAST("Reported Total Nurse Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Reported RN Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Reported LPN Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Reported Nurse Aide Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Number of Facility Reported Incidents" AS INTEGER), TRY_CAST("Total nursing staff turnover" AS FLOAT), TRY_CAST("Registered Nurse turnover" AS FLOAT), TRY_CAST("Processing Date" AS DATE) FROM healthcare.raw.provider_info_raw_stream;
+INSERT INTO healthcare.staging.nh_provider_info_staging ("CMS Certification Number (CCN)", "Provider Name", "Provider Address", "City/Town", "State", "Average Number of Residents per Day", "Number of Certified Beds", "Reported Total Nurse Staffing Hours per Resident per Day", "Reported RN Staffing Hours per Resident per Day", "Reported LPN Staffing Hours per Resident per Day", "Reported Nurse Aide Staffing Hours per Resident per Day", "Number of Facility Reported Incidents", "Total nursing staff turnover", "Registered Nurse turnover", "Processing Date", "SOURCE_FILE", "SOURCE_FILE_ROW", "LOADED_AT") SELECT "CMS Certification Number (CCN)", "Provider Name", "Provider Address", "City/Town", "State", TRY_CAST("Average Number of Residents per Day" AS FLOAT), TRY_CAST("Number of Certified Beds" AS INTEGER), TRY_CAST("Reported Total Nurse Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Reported RN Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Reported LPN Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Reported Nurse Aide Staffing Hours per Resident per Day" AS FLOAT), TRY_CAST("Number of Facility Reported Incidents" AS INTEGER), TRY_CAST("Total nursing staff turnover" AS FLOAT), TRY_CAST("Registered Nurse turnover" AS FLOAT), TRY_CAST("Processing Date" AS DATE), "SOURCE_FILE", "SOURCE_FILE_ROW", "LOADED_AT" FROM healthcare.raw.provider_info_raw_stream;
 """)
 cursor.execute("""
 CREATE OR REPLACE STREAM HEALTHCARE.STAGING.provider_info_staging_stream
 ON TABLE HEALTHCARE.staging.nh_provider_info_staging
 APPEND_ONLY = TRUE;
 """)
-cursor.execute("""
+cursor.execute(f"""
 CREATE OR REPLACE TASK healthcare.staging.provider_info_target_task
 WAREHOUSE = 'compute_wh'
 AFTER healthcare.staging.load_provider_info_staging_task
 WHEN SYSTEM$STREAM_HAS_DATA('healthcare.staging.provider_info_staging_stream')
 AS
-MERGE INTO healthcare.public.nh_provider_info_target AS target
-USING healthcare.staging.nh_provider_info_staging AS source
-ON target."CMS Certification Number (CCN)" = source."CMS Certification Number (CCN)"
-WHEN MATCHED THEN UPDATE SET
-    "Provider Name" = source."Provider Name",
-    "Provider Address" = source."Provider Address",
-    "City/Town" = source."City/Town",
-    "State" = source."State",
-    "Average Number of Residents per Day" = source."Average Number of Residents per Day",
-    "Number of Certified Beds" = source."Number of Certified Beds",
-    "Reported Total Nurse Staffing Hours per Resident per Day" = source."Reported Total Nurse Staffing Hours per Resident per Day",
-    "Reported RN Staffing Hours per Resident per Day" = source."Reported RN Staffing Hours per Resident per Day",
-    "Reported LPN Staffing Hours per Resident per Day" = source."Reported LPN Staffing Hours per Resident per Day",
-    "Reported Nurse Aide Staffing Hours per Resident per Day" = source."Reported Nurse Aide Staffing Hours per Resident per Day",
-    "Number of Facility Reported Incidents" = source."Number of Facility Reported Incidents",
-    "Total nursing staff turnover" = source."Total nursing staff turnover",
-    "Registered Nurse turnover" = source."Registered Nurse turnover",
-    "Processing Date" = source."Processing Date"
-WHEN NOT MATCHED THEN INSERT (
-    "CMS Certification Number (CCN)",
-    "Provider Name",
-    "Provider Address",
-    "City/Town",
-    "State",
-    "Average Number of Residents per Day",
-    "Number of Certified Beds",
-    "Reported Total Nurse Staffing Hours per Resident per Day",
-    "Reported RN Staffing Hours per Resident per Day",
-    "Reported LPN Staffing Hours per Resident per Day",
-    "Reported Nurse Aide Staffing Hours per Resident per Day",
-    "Number of Facility Reported Incidents",
-    "Total nursing staff turnover",
-    "Registered Nurse turnover",
-    "Processing Date"
-)
-VALUES (
-    source."CMS Certification Number (CCN)",
-    source."Provider Name",
-    source."Provider Address",
-    source."City/Town",
-    source."State",
-    source."Average Number of Residents per Day",
-    source."Number of Certified Beds",
-    source."Reported Total Nurse Staffing Hours per Resident per Day",
-    source."Reported RN Staffing Hours per Resident per Day",
-    source."Reported LPN Staffing Hours per Resident per Day",
-    source."Reported Nurse Aide Staffing Hours per Resident per Day",
-    source."Number of Facility Reported Incidents",
-    source."Total nursing staff turnover",
-    source."Registered Nurse turnover",
-    source."Processing Date"
-);
+{PROVIDER_INFO_TARGET_MERGE}
 """)
 cursor.close()
 conn.close()
\ No newline at end of file
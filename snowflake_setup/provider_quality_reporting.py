@@ -62,6 +62,8 @@ CREATE OR REPLACE TABLE staging.provider_quality_reporting_staging (
 	LOCATION1 VARCHAR
 );  
 """)
+# Clustered by measure: the dashboard reads one "Measure Code" at a time (e.g. the
+# throughput chart's S_005_02_DTC_OBS_RATE), so a query only scans that measure's partitions.
 cursor.execute("""
 CREATE OR REPLACE TABLE public.provider_quality_reporting_target (
     "CMS Certification Number (CCN)" VARCHAR,
@@ -80,7 +82,8 @@ CREATE OR REPLACE TABLE public.provider_quality_reporting_target (
 	"End Date" date,
 	"Measure Date Range" VARCHAR,
 	LOCATION1 VARCHAR
-); 
+)
+CLUSTER BY ("Measure Code");
 """)
 cursor.execute("""
 CREATE OR REPLACE STREAM HEALTHCARE.RAW.quality_reporting_provider_stream
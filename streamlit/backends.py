@@ -0,0 +1,72 @@
+import os
+import time
+
+import streamlit as st
+from query_log import timed_import
+
+# Query engine behind the dashboard: "snowflake", or "local" for DuckDB over Parquet
+# snapshots of the target tables (see local_backend.py), which needs no network.
+BACKEND = os.environ.get("DASHBOARD_BACKEND", "snowflake")
+
+
+def get_connection_pool():
+    # Imported on first use: snowflake.connector and cryptography take about a second to
+    # import, and the page shell should render before they load.
+    return timed_import("connection").get_connection_pool()
+
+
+class SnowflakeBackend:
+    """Runs dashboard queries on the pooled Snowflake connections."""
+
+    label = "Snowflake"
+
+    def check(self):
+        """Checks out a connection, surfacing bad credentials before any tab renders."""
+        with get_connection_pool().connection():
+            pass
+
+    def execute(self, query, params, tag):
+        """Runs `query` with QUERY_TAG `tag`; returns (compact DataFrame, seconds spent fetching)."""
+        fetch_compact = timed_import("compact_fetch").fetch_compact
+        fetch_seconds = []
+
+        def fetch(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(query, params, _statement_params={"QUERY_TAG": tag})
+                fetch_start = time.perf_counter()
+                df = fetch_compact(cursor)
+                fetch_seconds.append(time.perf_counter() - fetch_start)
+                return df
+
+        df = get_connection_pool().run(fetch)
+        return df, sum(fetch_seconds)
+
+    def stream(self, query, params, tag):
+        """Runs `query` with QUERY_TAG `tag` and yields its result as Arrow record batches."""
+        # Exports are the only streamed queries, and can run for minutes; they get a connection
+        # of their own rather than one of the pool's, which dashboard queries wait on.
+        with timed_import("connection").export_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params, _statement_params={"QUERY_TAG": tag})
+            empty = True
+            for table in cursor.fetch_arrow_batches():
+                empty = False
+                yield from table.to_batches()
+            if empty:
+                # No Arrow chunks come back for an empty result; keep its column names.
+                import pyarrow as pa
+
+                yield pa.RecordBatch.from_pydict({column.name: pa.nulls(0) for column in cursor.description})
+
+    def close(self):
+        pass
+
+
+@st.cache_resource(show_spinner=False, on_release=lambda backend: backend.close())
+def get_backend():
+    """Returns the process-wide query backend selected by DASHBOARD_BACKEND."""
+    if BACKEND == "snowflake":
+        return SnowflakeBackend()
+    if BACKEND == "local":
+        # Imported here so Snowflake deployments do not need DuckDB installed.
+        return timed_import("local_backend").LocalBackend()
+    raise ValueError(f"Unknown DASHBOARD_BACKEND {BACKEND!r}; expected 'snowflake' or 'local'.")
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+import streamlit as st
+
+from data_grid import paged_dataframe
+
+# Total size of serialized figures kept by the process-wide figure cache.
+MAX_FIGURE_CACHE_BYTES = int(os.environ.get("DASHBOARD_FIGURE_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Above this many points a scatter is drawn with WebGL instead of one SVG marker per point.
+WEBGL_POINT_THRESHOLD = 1000
+
+# Above this many points a scatter is replaced by a chart of 2D bins sized by provider count.
+BINNED_POINT_THRESHOLD = 5000
+
+# Bins along each axis of a binned scatter.
+BINS_PER_AXIS = 60
+
+
+class FigureCache:
+    """
+    Process-wide LRU of serialized Plotly figures, bounded by their total JSON size.
+
+    Entries are keyed by a hash of everything that determines a figure (chart, dataset
+    version and filters), so a cached figure never needs invalidating; entries for old
+    versions simply age out.
+    """
+
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            figure_json = self._entries.get(key)
+            if figure_json is not None:
+                self._entries.move_to_end(key)
+            return figure_json
+
+    def put(self, key, figure_json):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = figure_json
+            self._bytes += len(figure_json)
+            while self._bytes > self._max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    return FigureCache(MAX_FIGURE_CACHE_BYTES)
+
+
+def cached_figure(spec, build):
+    """
+    Returns the figure identified by `spec`, calling build() only when it is not cached.
+
+    `spec` names the chart and everything its contents depend on, typically the chart id,
+    the dataset version and the filter selection. Rebuilding a figure with Plotly Express
+    costs far more than restoring it from JSON, so reruns triggered by unrelated widgets
+    get their charts back almost for free.
+    """
+    key = hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+    cache = get_figure_cache()
+    figure_json = cache.get(key)
+    if figure_json is None:
+        figure_json = pio.to_json(build(), validate=False)
+        cache.put(key, figure_json)
+    return pio.from_json(figure_json, skip_invalid=True)
+
+
+def bin_points(xs, ys, bins=BINS_PER_AXIS):
+    """
+    Assigns each (x, y) point to a cell of an evenly spaced bins x bins grid.
+
+    Returns the cell id of every point and, for each occupied cell, its id, centre
+    coordinates and point count. Everything is vectorized, so this stays fast for
+    hundreds of thousands of points.
+    """
+    x_edges = np.linspace(xs.min(), xs.max(), bins + 1)
+    y_edges = np.linspace(ys.min(), ys.max(), bins + 1)
+    x_bins = np.clip(np.searchsorted(x_edges, xs, side="right") - 1, 0, bins - 1)
+    y_bins = np.clip(np.searchsorted(y_edges, ys, side="right") - 1, 0, bins - 1)
+    cells = x_bins * bins + y_bins
+
+    counts = np.bincount(cells, minlength=bins * bins)
+    occupied = np.flatnonzero(counts)
+    x_centres = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centres = (y_edges[:-1] + y_edges[1:]) / 2
+    return cells, occupied, x_centres[occupied // bins], y_centres[occupied % bins], counts[occupied]
+
+
+def scale_aware_scatter(df, key, spec, layout=None, **scatter_args):
+    """
+    Renders a px.scatter of `df` with a strategy chosen by the number of points.
+
+    Small frames get the regular SVG scatter and mid-sized ones are drawn with WebGL.
+    Above BINNED_POINT_THRESHOLD the points are aggregated into 2D bins; selecting bins
+    in the chart then lists the providers inside them, so per-provider detail is only
+    sent to the browser when asked for. `spec` identifies the data for cached_figure().
+    """
+    x, y = scatter_args["x"], scatter_args["y"]
+    if len(df) <= BINNED_POINT_THRESHOLD:
+        render_mode = "webgl" if len(df) > WEBGL_POINT_THRESHOLD else "svg"
+
+        def build():
+            fig = px.scatter(df, render_mode=render_mode, **scatter_args)
+            return fig.update_layout(**layout) if layout else fig
+
+        st.plotly_chart(cached_figure((key, spec), build), width="stretch")
+        return
+
+    points = df[np.isfinite(df[x].to_numpy(dtype=float)) & np.isfinite(df[y].to_numpy(dtype=float))]
+    cells, occupied, x_centres, y_centres, counts = bin_points(
+        points[x].to_numpy(dtype=float), points[y].to_numpy(dtype=float)
+    )
+
+    def build():
+        binned = pd.DataFrame({x: x_centres, y: y_centres, "Providers": counts, "Cell": occupied})
+        fig = px.scatter(
+            binned,
+            x=x,
+            y=y,
+            size="Providers",
+            color="Providers",
+            custom_data=["Cell"],
+            title=scatter_args.get("title"),
+            labels=scatter_args.get("labels"),
+            color_continuous_scale=scatter_args.get("color_continuous_scale"),
+        )
+        return fig.update_layout(**layout) if layout else fig
+
+    st.caption(f"{len(points):,} providers grouped into {len(occupied):,} bins. Select bins to list their providers.")
+    event = st.plotly_chart(
+        cached_figure((key, spec, "binned"), build),
+        width="stretch",
+        key=key,
+        on_select="rerun",
+        selection_mode=("points", "box", "lasso"),
+    )
+
+    selected_cells = [point["customdata"][0] for point in event.selection.points]
+    if selected_cells:
+        paged_dataframe(points[np.isin(cells, selected_cells)], key=f"{key}_selection")
@@ -0,0 +1,77 @@
+import json
+
+import pandas as pd
+from dashboard_data import DATASET_LOADERS, run_query
+from query_log import QUERY_TAG_PREFIX
+
+# Target tables with a declared clustering key (see the CLUSTER BY clauses in snowflake_setup/).
+CLUSTERED_TABLES = [
+    "HEALTHCARE.PUBLIC.DAILY_NURSE_STAFFING_TARGET",
+    "HEALTHCARE.PUBLIC.NH_PROVIDER_INFO_TARGET",
+    "HEALTHCARE.PUBLIC.PROVIDER_QUALITY_REPORTING_TARGET",
+]
+
+# Days of query history the pruning report covers. ACCOUNT_USAGE.QUERY_HISTORY lags by up to 45 minutes.
+PRUNING_HISTORY_DAYS = 7
+
+# Partitions at or below this depth count as well clustered in the report.
+WELL_CLUSTERED_DEPTH = 2
+
+
+def clustering_summary(table, info):
+    """Flattens the SYSTEM$CLUSTERING_INFORMATION JSON of `table` into one report row."""
+    total = info.get("total_partition_count", 0)
+    histogram = {int(depth): count for depth, count in info.get("partition_depth_histogram", {}).items()}
+    shallow = sum(count for depth, count in histogram.items() if depth <= WELL_CLUSTERED_DEPTH)
+    return {
+        "Table": table,
+        "ClusterBy": info.get("cluster_by_keys"),
+        "Partitions": total,
+        "ConstantPartitions": info.get("total_constant_partition_count", 0),
+        "AverageOverlaps": info.get("average_overlaps"),
+        "AverageDepth": info.get("average_depth"),
+        f"ShareAtDepth<={WELL_CLUSTERED_DEPTH}": shallow / total if total else None,
+    }
+
+
+def load_clustering_information():
+    """Reads partition depth and overlap for every clustered target table in one query."""
+    query = "\nUNION ALL\n".join(
+        f"SELECT '{table}' AS \"Table\", SYSTEM$CLUSTERING_INFORMATION('{table}') AS \"Info\""
+        for table in CLUSTERED_TABLES
+    )
+    df = run_query("clustering_information", query)
+    return pd.DataFrame(
+        [clustering_summary(row["Table"], json.loads(row["Info"])) for _, row in df.iterrows()]
+    ).set_index("Table")
+
+
+def load_pruning_history(days=PRUNING_HISTORY_DAYS):
+    """
+    Returns the partitions scanned out of the partitions total of each dashboard query over
+    the last `days` days, found in the query history by the QUERY_TAG every query carries.
+
+    Every registered dataset query is listed, with no executions if it has not run.
+    """
+    query = """
+    SELECT
+        SPLIT_PART(QUERY_TAG, ':', 2) AS "Query",
+        COUNT(*) AS "Executions",
+        SUM(PARTITIONS_SCANNED) AS "PartitionsScanned",
+        SUM(PARTITIONS_TOTAL) AS "PartitionsTotal",
+        MEDIAN(TOTAL_ELAPSED_TIME) / 1000 AS "MedianSeconds"
+    FROM
+        SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+    WHERE
+        STARTSWITH(QUERY_TAG, ?)
+        AND START_TIME >= DATEADD('day', ?, CURRENT_TIMESTAMP())
+        AND EXECUTION_STATUS = 'SUCCESS'
+    GROUP BY
+        "Query";
+    """
+    df = run_query("pruning_history", query, [f"{QUERY_TAG_PREFIX}:", -days]).set_index("Query")
+    df = df.reindex(df.index.union(list(DATASET_LOADERS)))
+    df["Executions"] = df["Executions"].fillna(0).astype(int)
+    # 1.0 means every partition of the tables read was scanned: nothing was pruned.
+    df["ScannedRatio"] = df["PartitionsScanned"] / df["PartitionsTotal"].where(df["PartitionsTotal"] > 0)
+    return df.sort_values("ScannedRatio", ascending=False)
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# A query whose Arrow result grows past this many bytes is aborted instead of being
+# materialized, so one oversized result cannot exhaust a replica's memory.
+MAX_RESULT_BYTES = int(os.environ.get("DASHBOARD_MAX_RESULT_BYTES", 256 * 1024 * 1024))
+
+# String columns with at most this share of distinct values become pandas categoricals.
+CATEGORICAL_MAX_DISTINCT_RATIO = 0.5
+
+
+class ResultTooLarge(Exception):
+    """Raised when a query result exceeds its memory budget."""
+
+
+def fetch_compact(cursor, max_bytes=None):
+    """
+    Streams an executed cursor's result as Arrow batches into a compactly typed DataFrame.
+
+    Batches are kept in Arrow form while they arrive and the running size is checked
+    against `max_bytes`, so an oversized result fails early rather than after pandas
+    has materialized all of it.
+    """
+    batches = collect_batches(cursor.fetch_arrow_batches(), max_bytes)
+    if not batches:
+        return pd.DataFrame(columns=[column.name for column in cursor.description])
+    return compact_table(pa.concat_tables(batches, promote_options="permissive"))
+
+
+def collect_batches(batches, max_bytes=None):
+    """Collects Arrow tables or record batches, raising ResultTooLarge once they pass `max_bytes`."""
+    max_bytes = MAX_RESULT_BYTES if max_bytes is None else max_bytes
+    collected = []
+    total_bytes = 0
+    for batch in batches:
+        total_bytes += batch.nbytes
+        if total_bytes > max_bytes:
+            raise ResultTooLarge(
+                f"Query result exceeded {max_bytes:,} bytes after {sum(len(b) for b in collected):,} rows."
+            )
+        collected.append(batch)
+    return collected
+
+
+def compact_table(table):
+    """
+    Converts an Arrow table to pandas with the smallest lossless dtypes.
+
+    Low-cardinality strings are dictionary-encoded into categoricals, decimals become
+    floats, and integers and floats are downcast when every value survives the
+    narrower type unchanged.
+    """
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            distinct = pc.count_distinct(column, mode="all").as_py()
+            if len(column) and distinct <= CATEGORICAL_MAX_DISTINCT_RATIO * len(column):
+                column = column.dictionary_encode()
+        elif pa.types.is_decimal(column.type):
+            column = column.cast(pa.float64())
+        columns.append((name, column))
+    df = pa.table(dict(columns)).to_pandas(date_as_object=False)
+
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_integer_dtype(series.dtype):
+            df[name] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series.dtype) and series.dtype != np.float32:
+            with np.errstate(over="ignore"):
+                narrow = series.astype(np.float32)
+            if np.array_equal(narrow.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+                df[name] = narrow
+    return df
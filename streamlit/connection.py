@@ -0,0 +1,178 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+import snowflake.connector
+import toml
+from cryptography.hazmat.primitives import serialization
+from snowflake.connector.errors import DatabaseError
+
+# Upper bound on pooled Snowflake sessions for dashboard queries, shared by every user session.
+MAX_CONNECTIONS = 4
+
+# Upper bound on the extra sessions held by exports running at once, outside the pool.
+MAX_EXPORT_CONNECTIONS = 2
+
+# Idle connections older than this are pinged before reuse instead of being trusted blindly.
+HEALTH_CHECK_AFTER_SECONDS = 300
+
+# Error codes meaning the session behind a connection is gone and a new one is needed:
+# session no longer exists, session expired, master token expired, connection closed.
+SESSION_EXPIRED_ERRNOS = {390111, 390112, 390114, 250002}
+
+
+def load_snowflake_settings():
+    """Reads the Snowflake secrets and parses the private key they point to."""
+    # Get the absolute path to the secrets.toml file
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    secrets_path = os.path.join(current_dir, '.streamlit', 'secrets.toml')
+
+    if 'snowflake' in st.secrets:
+        snowflake_secrets = st.secrets.snowflake
+        # Get the private key content and passphrase from the secrets
+        private_key_content = snowflake_secrets.get('private_key_content')
+        private_key_passphrase = snowflake_secrets.get('private_key_passphrase')
+
+        # Load the private key from the content
+        p_key = serialization.load_pem_private_key(
+            private_key_content.encode('utf-8'),
+            password=private_key_passphrase.encode() if private_key_passphrase else None
+        )
+    else:
+        # Fallback for local testing, loading from a local secrets.toml file
+        secrets = toml.load(secrets_path)
+        snowflake_secrets = secrets.get('snowflake')
+        # Get the private key path and passphrase from the secrets
+        private_key_path = snowflake_secrets.get('private_key_path')
+        private_key_passphrase = snowflake_secrets.get('private_key_passphrase')
+
+        # Load the private key
+        with open(private_key_path, "rb") as key_file:
+            p_key = serialization.load_pem_private_key(
+                key_file.read(),
+                password=private_key_passphrase.encode() if private_key_passphrase else None
+            )
+    return snowflake_secrets, p_key
+
+
+class ConnectionPool:
+    """A bounded pool of Snowflake connections that are health-checked on checkout."""
+
+    def __init__(self, connect, max_size=MAX_CONNECTIONS):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if conn.is_closed():
+                continue
+            if time.monotonic() - returned_at > HEALTH_CHECK_AFTER_SECONDS and not conn.is_valid():
+                self._discard(conn)
+                continue
+            return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Checks out a connection, blocking while MAX_CONNECTIONS are already in use."""
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except DatabaseError as e:
+            if conn is not None and e.errno in SESSION_EXPIRED_ERRNOS:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                if conn.is_closed():
+                    self._discard(conn)
+                else:
+                    self._idle.put((conn, time.monotonic()))
+            self._slots.release()
+
+    def run(self, work):
+        """Calls work(conn) on a pooled connection, reconnecting once if the session has expired."""
+        try:
+            with self.connection() as conn:
+                return work(conn)
+        except DatabaseError as e:
+            if e.errno not in SESSION_EXPIRED_ERRNOS:
+                raise
+        with self.connection() as conn:
+            return work(conn)
+
+    def close(self):
+        """Closes every idle connection held by the pool."""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+@st.cache_resource(show_spinner=False)
+def get_snowflake_settings():
+    """Returns the Snowflake secrets and private key, parsing the key only once per process."""
+    return load_snowflake_settings()
+
+
+def connect():
+    """Opens a new Snowflake connection with the dashboard's settings."""
+    snowflake_secrets, p_key = get_snowflake_settings()
+    return snowflake.connector.connect(
+        user=snowflake_secrets.get('user'),
+        account=snowflake_secrets.get('account'),
+        private_key=p_key,
+        warehouse=snowflake_secrets.get('warehouse'),
+        database=snowflake_secrets.get('database'),
+        schema=snowflake_secrets.get('schema'),
+        client_session_keep_alive=True,
+        # Weeks start on Monday (ISO weeks), as in the staffing rollups.
+        session_parameters={'WEEK_START': 1},
+        # Server-side binding, so filter values are sent as bind variables ("?").
+        paramstyle='qmark'
+    )
+
+
+@st.cache_resource(show_spinner=False, on_release=lambda pool: pool.close())
+def get_connection_pool():
+    """Returns the process-wide connection pool for dashboard queries."""
+    return ConnectionPool(connect)
+
+
+@st.cache_resource(show_spinner=False)
+def get_export_slots():
+    return threading.BoundedSemaphore(MAX_EXPORT_CONNECTIONS)
+
+
+@contextmanager
+def export_connection():
+    """
+    Opens a connection of its own for a long-running export and closes it afterwards.
+
+    Exports can stream millions of rows, so they never hold one of the pool's connections
+    that dashboard queries wait on. At most MAX_EXPORT_CONNECTIONS run at once.
+    """
+    with get_export_slots():
+        conn = connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
@@ -0,0 +1,751 @@
+import hashlib
+import inspect
+import time
+import pandas as pd
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from backends import get_backend
+from dataset_store import DatasetStore, TableVersions
+import disk_cache
+from query_log import get_query_log, query_tag
+
+# Copy-on-write is always on from pandas 3; earlier versions need it enabled so that
+# sessions can share dataset views safely (see load_dataset()).
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def run_query(name, query, params=None):
+    """
+    Runs query `name` on the configured backend and returns the result as a compactly typed DataFrame.
+
+    Every execution carries a QUERY_TAG naming the query, so it can be found in Snowflake's
+    query history, and its wall time, fetch time, rows and bytes go to the query log.
+    """
+    start = time.perf_counter()
+    try:
+        df, fetch_seconds = get_backend().execute(query, params, query_tag(name))
+    except Exception as e:
+        get_query_log().record("query", name, time.perf_counter() - start, error=type(e).__name__)
+        raise
+    get_query_log().record(
+        "query",
+        name,
+        time.perf_counter() - start,
+        fetch_seconds=fetch_seconds,
+        rows=len(df),
+        bytes=int(df.memory_usage(index=True, deep=True).sum()),
+    )
+    return df
+
+
+def stream_query(name, query, params=None):
+    """
+    Runs query `name` and yields its result as Arrow record batches, for results too large
+    to hold in memory. The query is logged like run_query() once the last batch is read.
+    """
+    start = time.perf_counter()
+    rows = 0
+    nbytes = 0
+    try:
+        for batch in get_backend().stream(query, params, query_tag(name)):
+            rows += batch.num_rows
+            nbytes += batch.nbytes
+            yield batch
+    except Exception as e:
+        get_query_log().record("query", name, time.perf_counter() - start, error=type(e).__name__)
+        raise
+    get_query_log().record("query", name, time.perf_counter() - start, rows=rows, bytes=nbytes)
+
+
+def normalize_filter(selected, all_values):
+    """
+    Turns a multiselect selection into a cache-friendly filter value.
+
+    Selecting everything means "no filter" and is returned as None; any other
+    selection becomes a sorted tuple so equal selections share one cache entry.
+    """
+    selected = set(selected)
+    if selected >= set(all_values):
+        return None
+    return tuple(sorted(selected))
+
+
+def where_clause(filters):
+    """
+    Builds a WHERE clause with one bind variable per filter value.
+
+    `filters` maps a column expression to the values to keep; None leaves the
+    column unfiltered and an empty tuple matches no rows.
+    """
+    predicates = []
+    params = []
+    for column, values in filters.items():
+        if values is None:
+            continue
+        if not values:
+            predicates.append("FALSE")
+            continue
+        predicates.append(f"{column} IN ({', '.join(['?'] * len(values))})")
+        params.extend(values)
+    if not predicates:
+        return "", params
+    return "WHERE " + " AND ".join(predicates), params
+
+
+# Label given to the row that rolls up every group outside the top N.
+OTHER_LABEL = "Other"
+
+# Grouping levels a ranked aggregation can be computed at, as the columns grouped by.
+RANK_LEVELS = {
+    "provider": ["PROVNAME", "STATE"],
+    "state": ["STATE"],
+}
+
+
+def ranked_query(table, measure, alias, level, where=""):
+    """
+    Builds a query for the top N groups by SUM(`measure`) plus one rolled-up "Other" row.
+
+    Groups are ranked in the warehouse with a window function, so only N + 1 rows are
+    returned however many providers match. Bind N twice after the `where` parameters.
+    Every row carries its "Rank" and the number of "Groups" it stands for.
+    """
+    groups = RANK_LEVELS[level]
+    columns = ", ".join(groups)
+    other = ", ".join(f"'{OTHER_LABEL}'" for _ in groups)
+    return f"""
+    WITH grouped AS (
+        SELECT
+            {columns},
+            SUM({measure}) AS {alias}
+        FROM
+            {table}
+        {where}
+        GROUP BY
+            {columns}
+    ),
+    ranked AS (
+        SELECT
+            grouped.*,
+            ROW_NUMBER() OVER (ORDER BY {alias} DESC NULLS LAST, {columns}) AS "Rank"
+        FROM
+            grouped
+    )
+    SELECT {columns}, {alias}, "Rank", 1 AS "Groups"
+    FROM ranked
+    WHERE "Rank" <= ?
+    UNION ALL
+    SELECT {other}, SUM({alias}), MIN("Rank"), COUNT(*)
+    FROM ranked
+    WHERE "Rank" > ?
+    HAVING COUNT(*) > 0
+    ORDER BY "Rank";
+    """
+
+
+# Rollup tables maintained incrementally by snowflake_setup/dashboard_rollups.py. They hold
+# a row per group rather than per provider-day, so dashboard queries scan kilobytes.
+# Averages are kept as a sum and a count of non-null values per group.
+STAFFING_PROVIDER_ROLLUP = "HEALTHCARE.PUBLIC.STAFFING_PROVIDER_ROLLUP"
+PROVIDER_INFO_STATE_MONTH_ROLLUP = "HEALTHCARE.PUBLIC.PROVIDER_INFO_STATE_MONTH_ROLLUP"
+PROVIDER_INFO_PROVIDER_MONTH_ROLLUP = "HEALTHCARE.PUBLIC.PROVIDER_INFO_PROVIDER_MONTH_ROLLUP"
+PROVIDER_INFO_MONTH_ROLLUP = "HEALTHCARE.PUBLIC.PROVIDER_INFO_MONTH_ROLLUP"
+
+# Time grains staffing hours can be reported at, finest first, with the column holding
+# the first day of each period. Weeks are ISO weeks, starting on Monday.
+TIME_GRAINS = {
+    "day": "WORKDATE",
+    "week": "WORKWEEK",
+    "month": "WORKMONTH",
+    "quarter": "WORKQUARTER",
+}
+
+# The grains whose periods each grain's periods are made of exactly. An ISO week can
+# straddle two months or quarters, so it can only be built from days; None is all time.
+GRAIN_PARTS = {
+    None: [None, "quarter", "month", "week", "day"],
+    "quarter": ["quarter", "month", "day"],
+    "month": ["month", "day"],
+    "week": ["week", "day"],
+    "day": ["day"],
+}
+
+# Staffing rollups, coarsest first, as (table, time grain). All of them group by
+# provider (PROVNUM, PROVNAME) and STATE and carry the same hour totals.
+STAFFING_ROLLUPS = [
+    (STAFFING_PROVIDER_ROLLUP, None),
+    ("HEALTHCARE.PUBLIC.STAFFING_PROVIDER_QUARTER_ROLLUP", "quarter"),
+    ("HEALTHCARE.PUBLIC.STAFFING_PROVIDER_MONTH_ROLLUP", "month"),
+    ("HEALTHCARE.PUBLIC.STAFFING_PROVIDER_WEEK_ROLLUP", "week"),
+    ("HEALTHCARE.PUBLIC.STAFFING_PROVIDER_DAY_ROLLUP", "day"),
+]
+STAFFING_ROLLUP_COLUMNS = {"PROVNUM", "PROVNAME", "STATE"}
+STAFFING_ROLLUP_MEASURES = {"TOTALNURSEHOURS", "TOTALCONTRACTEDHOURS"}
+
+# The days of PBJ data each staffing rollup refresh changed, with when it ran (CHANGED_AT,
+# epoch seconds), so refreshes re-read only the periods holding changed days.
+STAFFING_DAY_CHANGES = "HEALTHCARE.PUBLIC.STAFFING_DAY_CHANGES"
+
+# Refreshes look for days changed this long before the cached result was loaded, to cover
+# rollup refreshes still committing at the time and clock skew with the warehouse.
+CHANGE_MARGIN_SECONDS = 15 * 60
+
+
+def period_start(grain, day):
+    """Returns the first day of the `grain` period containing `day`."""
+    if grain == "week":
+        return day - pd.Timedelta(days=day.weekday())
+    if grain == "month":
+        return day.replace(day=1)
+    if grain == "quarter":
+        return day.replace(month=3 * ((day.month - 1) // 3) + 1, day=1)
+    return day
+
+
+def route_staffing_query(grain, columns=(), measures=()):
+    """
+    Picks the coarsest staffing rollup that answers a query exactly.
+
+    The query reports `measures` per `grain` period (None for all time), grouped or
+    filtered by `columns`. A rollup qualifies when its periods add up exactly to the
+    requested ones and it has the columns and measures. Returns (table, rollup period
+    column, period expression); the column and expression are None for all time.
+    """
+    for table, rollup_grain in STAFFING_ROLLUPS:
+        if rollup_grain not in GRAIN_PARTS[grain]:
+            continue
+        if not set(columns) <= STAFFING_ROLLUP_COLUMNS or not set(measures) <= STAFFING_ROLLUP_MEASURES:
+            continue
+        if grain is None:
+            return table, None, None
+        column = TIME_GRAINS[rollup_grain]
+        return table, column, column if rollup_grain == grain else f"DATE_TRUNC('{grain}', {column})"
+    raise ValueError(f"No staffing rollup can answer {list(measures)} by {grain} grouped by {list(columns)}.")
+
+
+# Staffing averages computed from a provider-info rollup, as in the State and Provider tabs.
+STAFFING_AVERAGE_COLUMNS = ",\n        ".join([
+    'SUM(RESIDENTS_SUM) / NULLIF(SUM(RESIDENTS_COUNT), 0) AS "Average Residents Per Day"',
+    'SUM(TOTAL_STAFFING_SUM) / NULLIF(SUM(TOTAL_STAFFING_COUNT), 0) AS "Average Total Nurse Staffing Hours"',
+    'SUM(RN_STAFFING_SUM) / NULLIF(SUM(RN_STAFFING_COUNT), 0) AS "Average RN Staffing Hours"',
+    'SUM(LPN_STAFFING_SUM) / NULLIF(SUM(LPN_STAFFING_COUNT), 0) AS "Average LPN Staffing Hours"',
+    'SUM(AIDE_STAFFING_SUM) / NULLIF(SUM(AIDE_STAFFING_COUNT), 0) AS "Average Nurse Aide Staffing Hours"',
+    'DIV0(SUM(RESIDENTS_SUM) / NULLIF(SUM(RESIDENTS_COUNT), 0), SUM(TOTAL_STAFFING_SUM) / NULLIF(SUM(TOTAL_STAFFING_COUNT), 0)) AS "Residents to Total Nurse Ratio"',
+    'DIV0(SUM(RESIDENTS_SUM) / NULLIF(SUM(RESIDENTS_COUNT), 0), SUM(RN_STAFFING_SUM) / NULLIF(SUM(RN_STAFFING_COUNT), 0)) AS "Residents to RN Ratio"',
+])
+
+
+def latest_drop(table):
+    """
+    Returns a predicate keeping the rows of provider-info rollup `table` from the latest
+    monthly drop. The target keeps one row per provider and drop, so summing across
+    drops would count every provider once per month loaded.
+    """
+    return f'"ReportingMonth" = (SELECT MAX("ReportingMonth") FROM {table})'
+
+
+# Function to run the State-level aggregation query.
+def load_state_data():
+    """Loads and aggregates the staffing data by state."""
+    query = f"""
+    SELECT
+        "State",
+        {STAFFING_AVERAGE_COLUMNS}
+    FROM
+        {PROVIDER_INFO_STATE_MONTH_ROLLUP}
+    WHERE
+        {latest_drop(PROVIDER_INFO_STATE_MONTH_ROLLUP)}
+    GROUP BY
+        "State"
+    ORDER BY
+        "Residents to Total Nurse Ratio" DESC;
+    """
+    return run_query("state", query)
+
+# Function to run the Provider-level aggregation query.
+def load_provider_data():
+    """Loads and aggregates the staffing data by Provider"""
+    query = f"""
+    SELECT
+        "Provider Name",
+        {STAFFING_AVERAGE_COLUMNS}
+    FROM
+        {PROVIDER_INFO_PROVIDER_MONTH_ROLLUP}
+    WHERE
+        {latest_drop(PROVIDER_INFO_PROVIDER_MONTH_ROLLUP)}
+    GROUP BY
+        "Provider Name"
+    ORDER BY
+        "Residents to Total Nurse Ratio" DESC ;
+    """
+    return run_query("provider", query)
+
+
+def load_nurse_hours_filter_options():
+    """Loads the distinct state/provider (name and CCN) combinations used by the staffing filters."""
+    table, _, _ = route_staffing_query(None, ["STATE", "PROVNUM", "PROVNAME"])
+    query = f"""
+    SELECT DISTINCT
+        STATE,
+        PROVNUM,
+        PROVNAME
+    FROM
+        {table}
+    ORDER BY
+        STATE,
+        PROVNAME;
+    """
+    return run_query("nurse_hours_filter_options", query)
+
+
+def nurse_hours_query(states=None, providers=None, grain="month", since=None, periods=None):
+    """
+    Builds the nurse-hours aggregation for the selected states and providers; returns (query, params).
+
+    Hours are totalled per `grain` period (see TIME_GRAINS) from the coarsest rollup that
+    holds them exactly. `since`, the first day of a `grain` period, keeps that period and
+    later ones; `periods` names a relation whose PERIOD column lists the periods to keep.
+    """
+    period = TIME_GRAINS[grain]
+    table, rollup_period, period_expression = route_staffing_query(grain, ["PROVNAME", "STATE"], ["TOTALNURSEHOURS"])
+    where, params = where_clause({"STATE": states, "PROVNAME": providers})
+    if since is not None:
+        if period_start(grain, since) != since:
+            raise ValueError(f"Period bounds must be the first day of a {grain}, not {since}.")
+        # The rollup's periods nest in the requested ones, so this filter is exact and prunes.
+        where = f'{where} AND {rollup_period} >= ?' if where else f'WHERE {rollup_period} >= ?'
+        params.append(since)
+    join = f"""
+    JOIN
+        {periods} ON {period_expression} = {periods}.PERIOD""" if periods else ""
+    query = f"""
+    SELECT
+        PROVNAME,
+        STATE,
+        {period_expression} AS {period},
+        SUM(TOTALNURSEHOURS) AS TotalNurseHours
+    FROM
+        {table}{join}
+    {where}
+    GROUP BY
+        PROVNAME,
+        STATE,
+        {period}"""
+    return query, params
+
+
+def load_nurse_hours_data(states=None, providers=None, grain="month"):
+    """
+    The SQL query to get the aggregated nurse hour data for the selected states and providers.
+
+    The frame's "loaded_at" attribute is when the query was sent, in epoch seconds.
+    """
+    loaded_at = time.time()
+    query, params = nurse_hours_query(states, providers, grain)
+    query = f"""{query}
+    ORDER BY
+        TotalNurseHours DESC;
+    """
+    df = run_query("nurse_hours", query, params)
+    df.attrs["loaded_at"] = loaded_at
+    return df
+
+
+def load_nurse_hours_changes(states=None, providers=None, since=None, changed_since=0, grain="month"):
+    """
+    In one query, the nurse-hours rows of the `grain` periods from `since` on and of the
+    earlier periods with a day changed after `changed_since` (epoch seconds). Each changed
+    period also gets a row with null hours, so periods left with no rows are seen too.
+    """
+    changed_period = "WORKDATE" if grain == "day" else f"DATE_TRUNC('{grain}', WORKDATE)"
+    recent, recent_params = nurse_hours_query(states, providers, grain, since=since)
+    changed, changed_params = nurse_hours_query(states, providers, grain, periods="changed")
+    query = f"""
+    WITH changed AS (
+        SELECT DISTINCT
+            {changed_period} AS PERIOD
+        FROM
+            {STAFFING_DAY_CHANGES}
+        WHERE
+            CHANGED_AT > ? AND WORKDATE < ?
+    ){recent}
+    UNION ALL{changed}
+    UNION ALL
+    SELECT NULL, NULL, PERIOD, NULL
+    FROM changed;
+    """
+    params = [changed_since, since, *recent_params, *changed_params]
+    return run_query("nurse_hours_refresh", query, params)
+
+
+def refresh_nurse_hours_data(previous, states=None, providers=None, grain="month"):
+    """
+    Incrementally refreshes a cached nurse-hours result.
+
+    New PBJ loads mostly add WorkDates, and late corrections touch a few older days. So
+    only the cached high-water period (which may have been partial), anything newer, and
+    the older periods the rollup refresh recorded a changed day in since the cached result
+    was loaded are re-queried, in one query, and spliced into the cached frame. Refresh
+    cost follows what changed, not how much history the table holds.
+    """
+    loaded_at = None if previous is None else previous.attrs.get("loaded_at")
+    if previous is None or previous.empty or loaded_at is None:
+        return load_nurse_hours_data(states, providers, grain=grain)
+    period = TIME_GRAINS[grain]
+    periods = pd.to_datetime(previous[period])
+    high_water = periods.max()
+    refreshed_at = time.time()
+    changes = load_nurse_hours_changes(
+        states, providers, high_water.date(), loaded_at - CHANGE_MARGIN_SECONDS, grain
+    )
+    # Rollup hours are never null, so null hours mark a changed period.
+    markers = changes['TOTALNURSEHOURS'].isna()
+    stale = (periods >= high_water) | periods.isin(pd.to_datetime(changes.loc[markers, period]))
+    df = pd.concat([previous[~stale], changes[~markers]], ignore_index=True)
+    # Concatenating categoricals with different categories falls back to plain strings.
+    for column in ('PROVNAME', 'STATE'):
+        if isinstance(previous[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    df = df.sort_values('TOTALNURSEHOURS', ascending=False, ignore_index=True)
+    df.attrs["loaded_at"] = refreshed_at
+    return df
+
+
+def load_nurse_hours_ranked_data(states=None, providers=None, n=20, level="provider"):
+    """Total nurse hours for the top `n` groups at `level`, with the rest rolled up into "Other"."""
+    where, params = where_clause({"STATE": states, "PROVNAME": providers})
+    table, _, _ = route_staffing_query(None, ["STATE", "PROVNAME", *RANK_LEVELS[level]], ["TOTALNURSEHOURS"])
+    query = ranked_query(table, "TOTALNURSEHOURS", "TotalNurseHours", level, where)
+    return run_query("nurse_hours_ranked", query, params + [n, n])
+
+
+def load_contract_hours_data(states=None, providers=None, n=10, level="provider"):
+    # This query calculates the total contracted hours for each hospital,
+    # using it as a proxy for overtime or high-demand staffing.
+    # The results are ordered to show the hospitals with the highest hours at the top.
+    # The state/provider filters are applied before the top `n` is taken, and the
+    # remaining hospitals are rolled up into a single "Other" row.
+    where, params = where_clause({"STATE": states, "PROVNAME": providers})
+    table, _, _ = route_staffing_query(None, ["STATE", "PROVNAME", *RANK_LEVELS[level]], ["TOTALCONTRACTEDHOURS"])
+    query = ranked_query(table, "TOTALCONTRACTEDHOURS", '"TotalContractedHours"', level, where)
+    return run_query("contract_hours", query, params + [n, n])
+
+
+def stream_daily_staffing_rows(states=None, providers=None):
+    """
+    Streams the daily PBJ staffing rows of the selected states and providers, for export.
+
+    The rows are left unsorted: an ORDER BY would make the engine hold the whole result
+    before returning the first batch.
+    """
+    where, params = where_clause({"STATE": states, "PROVNAME": providers})
+    query = f"""
+    SELECT
+        *
+    FROM
+        HEALTHCARE.PUBLIC.DAILY_NURSE_STAFFING_TARGET
+    {where};
+    """
+    return stream_query("daily_staffing_export", query, params)
+
+
+def load_health_occupancy_rate_data():
+# This query calculates the average monthly hospital occupancy rate for the month of
+#  October 1st, 2024 as this is the only date present in the source table. 
+# Occupancy Rate is calculated as (Total Residents / Total Certified Beds).
+    query = f"""
+    SELECT
+        "ReportingMonth",
+        SUM(RESIDENTS_SUM) AS "TotalResidents",
+        SUM(BEDS_SUM) AS "TotalCertifiedBeds",
+        ROUND(
+            SUM(RESIDENTS_SUM) * 100.0 / NULLIF(SUM(BEDS_SUM), 0),
+            2
+        ) AS "AverageOccupancyRate"
+    FROM
+        {PROVIDER_INFO_MONTH_ROLLUP}
+    WHERE
+        "ReportingMonth" >= '2024-10-01' -- Filters data from October 1st, 2024, onwards
+    GROUP BY
+        "ReportingMonth"
+    ORDER BY
+        "ReportingMonth" ASC; -- Orders the results chronologically
+    """
+    return run_query("occupancy_rate", query)
+
+def load_bed_utilization_rate_data():
+    query = f"""
+        SELECT
+            "Provider Name",
+            SUM(RESIDENTS_SUM) AS "TotalResidents",
+            SUM(BEDS_SUM) AS "TotalCertifiedBeds",
+            ROUND(
+                SUM(RESIDENTS_SUM) * 100.0 / NULLIF(SUM(BEDS_SUM), 0),
+                2
+            ) AS "BedUtilizationRate"
+        FROM
+            {PROVIDER_INFO_PROVIDER_MONTH_ROLLUP}
+        WHERE
+            {latest_drop(PROVIDER_INFO_PROVIDER_MONTH_ROLLUP)}
+        GROUP BY
+            "Provider Name"
+        HAVING 
+            SUM(RESIDENTS_COUNT) > 0
+        ORDER BY
+            "BedUtilizationRate" DESC;
+    """
+    return run_query("bed_utilization", query)
+
+def load_staffing_occupancy_comp_data():
+    query = f"""
+    SELECT
+        "Provider Name",
+        SUM(RESIDENTS_SUM) AS "TotalResidents",
+        SUM(RESIDENT_STAFFING_HOURS_SUM) AS "TotalResidentStaffingHours",
+        ROUND(
+            SUM(RESIDENTS_SUM) * 100.0 / NULLIF(SUM(BEDS_SUM), 0),
+            2
+        ) AS "BedUtilizationRate"
+    FROM
+        {PROVIDER_INFO_PROVIDER_MONTH_ROLLUP}
+    WHERE
+        {latest_drop(PROVIDER_INFO_PROVIDER_MONTH_ROLLUP)}
+    GROUP BY
+        "Provider Name"
+    HAVING 
+        SUM(RESIDENTS_COUNT) > 0
+    ORDER BY
+        "BedUtilizationRate" DESC;
+        """
+    return run_query("staffing_occupancy", query)
+
+def load_hospital_througput_data():
+    query = """
+    SELECT 
+        "Provider Name",
+        "Score" as PatientThroughputScore
+    FROM
+        HEALTHCARE.PUBLIC.PROVIDER_QUALITY_REPORTING_TARGET
+    WHERE
+        "Measure Code" = 'S_005_02_DTC_OBS_RATE'
+    And "Score" is not null
+    ORDER BY
+        "Score" DESC
+    LIMIT 10;
+        """
+    return run_query("hospital_throughput", query)
+
+def load_provider_staffing_data():
+    # The target keeps every monthly drop, so only the latest drop is ranked.
+    query = """
+    SELECT
+        "Provider Name",
+        "Reported Total Nurse Staffing Hours per Resident per Day" AS "StaffingHoursPerResident"
+    FROM
+        HEALTHCARE.PUBLIC.NH_PROVIDER_INFO_TARGET
+    WHERE
+        "Processing Date" = (SELECT MAX("Processing Date") FROM HEALTHCARE.PUBLIC.NH_PROVIDER_INFO_TARGET)
+    ORDER BY
+        "StaffingHoursPerResident" ASC
+    LIMIT 10;
+        """
+    return run_query("provider_staffing", query)
+
+
+# Dataset name -> loader. Each dashboard tab asks for the datasets it renders by
+# name, so only the queries behind the tab on screen are ever executed.
+DATASET_LOADERS = {
+    "state": load_state_data,
+    "provider": load_provider_data,
+    "nurse_hours_filter_options": load_nurse_hours_filter_options,
+    "nurse_hours": load_nurse_hours_data,
+    "nurse_hours_ranked": load_nurse_hours_ranked_data,
+    "contract_hours": load_contract_hours_data,
+    "occupancy_rate": load_health_occupancy_rate_data,
+    "bed_utilization": load_bed_utilization_rate_data,
+    "staffing_occupancy": load_staffing_occupancy_comp_data,
+    "hospital_throughput": load_hospital_througput_data,
+    "provider_staffing": load_provider_staffing_data,
+}
+
+# Datasets that can be refreshed from their previous result instead of re-querying everything.
+INCREMENTAL_LOADERS = {
+    "nurse_hours": refresh_nurse_hours_data,
+}
+
+# Source tables behind each dataset. A dataset is reloaded only when one of its sources changes.
+DATASET_SOURCES = {
+    "state": [PROVIDER_INFO_STATE_MONTH_ROLLUP],
+    "provider": [PROVIDER_INFO_PROVIDER_MONTH_ROLLUP],
+    "nurse_hours_filter_options": [STAFFING_PROVIDER_ROLLUP],
+    "nurse_hours": [table for table, grain in STAFFING_ROLLUPS if grain],
+    "nurse_hours_ranked": [STAFFING_PROVIDER_ROLLUP],
+    "contract_hours": [STAFFING_PROVIDER_ROLLUP],
+    "occupancy_rate": [PROVIDER_INFO_MONTH_ROLLUP],
+    "bed_utilization": [PROVIDER_INFO_PROVIDER_MONTH_ROLLUP],
+    "staffing_occupancy": [PROVIDER_INFO_PROVIDER_MONTH_ROLLUP],
+    "hospital_throughput": ["HEALTHCARE.PUBLIC.PROVIDER_QUALITY_REPORTING_TARGET"],
+    "provider_staffing": ["HEALTHCARE.PUBLIC.NH_PROVIDER_INFO_TARGET"],
+}
+
+# How often the source-table change signal is re-polled.
+VERSION_POLL_SECONDS = 60
+
+# If the change signal cannot be read, datasets fall back to expiring on this fixed interval.
+FALLBACK_TTL_SECONDS = 600
+
+# Datasets (per filter combination) kept in memory by the shared store.
+MAX_STORED_DATASETS = 256
+
+# Hash of this module's source, where every dataset's SQL is built. It is part of the
+# disk-cache keys, so after a deploy that changes a query no result of the old one is served.
+with open(__file__, "rb") as _source:
+    QUERY_SOURCE_HASH = hashlib.sha256(_source.read()).hexdigest()
+
+# Upper bound on queries submitted at once by DashboardData.prefetch().
+MAX_CONCURRENT_QUERIES = 4
+
+
+def load_table_versions():
+    """Reads last-altered time and row count for every source table in one metadata query."""
+    query = """
+    SELECT
+        TABLE_CATALOG || '.' || TABLE_SCHEMA || '.' || TABLE_NAME AS "Table",
+        LAST_ALTERED,
+        ROW_COUNT
+    FROM
+        HEALTHCARE.INFORMATION_SCHEMA.TABLES
+    WHERE
+        TABLE_SCHEMA IN ('PUBLIC', 'STAGING');
+    """
+    df = run_query("table_versions", query)
+    return {
+        row["Table"]: (str(row["LAST_ALTERED"]), row["ROW_COUNT"])
+        for _, row in df.iterrows()
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def get_table_versions():
+    return TableVersions(load_table_versions, VERSION_POLL_SECONDS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_store():
+    return DatasetStore(MAX_STORED_DATASETS)
+
+
+def source_version(name):
+    """Returns the current version of the tables behind dataset `name`."""
+    versions = get_table_versions().get()
+    sources = DATASET_SOURCES[name]
+    if not all(table in versions for table in sources):
+        return ("ttl", int(time.time() // FALLBACK_TTL_SECONDS))
+    return tuple(versions[table] for table in sources)
+
+
+def dataset_params(name, params):
+    """
+    Returns `params` with the defaults of dataset `name`'s loader filled in, as sorted pairs,
+    so that requests spelling out a default share a cache entry with those omitting it.
+
+    Raises TypeError for parameters the loader does not take.
+    """
+    bound = inspect.signature(DATASET_LOADERS[name]).bind(**params)
+    bound.apply_defaults()
+    return tuple(sorted(bound.arguments.items()))
+
+
+def load_dataset(name, **params):
+    """
+    Returns (version, frame) for dataset `name` and the given filters from the shared,
+    change-driven cache. `version` is the source version the frame was loaded at.
+
+    Misses fall through to the on-disk cache and then to the warehouse. Results are
+    keyed by source version, so a change to a source table is the only thing that
+    makes a dataset go stale, and stale results keep being served while they refresh.
+    """
+    start = time.perf_counter()
+    version = source_version(name)
+    key = dataset_params(name, params)
+    # Cache tier that answered this request: "memory" unless this call had to load it.
+    tier = ["memory"]
+
+    def load(previous):
+        disk_key = disk_cache.cache_key(f"{name}@{version}@{QUERY_SOURCE_HASH}", key)
+        df = disk_cache.read(disk_key)
+        source = "disk"
+        if df is None:
+            source = "warehouse"
+            if previous is not None and name in INCREMENTAL_LOADERS:
+                df = INCREMENTAL_LOADERS[name](previous, **params)
+            else:
+                df = DATASET_LOADERS[name](**params)
+            disk_cache.write(disk_key, df)
+        if previous is None:
+            tier[0] = source
+        return df
+
+    # Every session gets a zero-copy view of the one shared frame; with copy-on-write a
+    # tab that modifies its view only copies the columns it changes.
+    loaded_version, df = get_dataset_store().get((name, key), version, load)
+    cache = "stale" if loaded_version != version else tier[0]
+    get_query_log().record("dataset", name, time.perf_counter() - start, cache=cache, rows=len(df))
+    return loaded_version, df.copy(deep=False)
+
+
+class DashboardData:
+    """Lazily loads dashboard datasets the first time a tab asks for them."""
+
+    def __init__(self):
+        self._frames = {}
+
+    def get(self, name, **params):
+        """Returns the named dataset, running its query only on first use in this script run."""
+        key = (name, tuple(sorted(params.items())))
+        if key not in self._frames:
+            with st.spinner("Loading data..."):
+                self._frames[key] = load_dataset(name, **params)
+        return self._frames[key][1]
+
+    def version(self, name, **params):
+        """
+        Returns the source version of the named dataset as served to this script run.
+
+        While a stale frame is served during a refresh this is the frame's own, older
+        version, so anything derived from the frame can safely be cached under it.
+        """
+        key = (name, tuple(sorted(params.items())))
+        if key in self._frames:
+            return self._frames[key][0]
+        return source_version(name)
+
+    def prefetch(self, requests):
+        """
+        Submits the queries for all `requests` at once and waits for them together.
+
+        A request is a dataset name or a `(name, params)` pair. Each dataset still goes
+        through load_dataset(), so the shared caches are filled exactly as by get(), and
+        each worker checks out its own pooled connection; a cold view costs its slowest
+        query rather than the sum of all of them.
+        """
+        pending = {}
+        for request in requests:
+            name, params = (request, {}) if isinstance(request, str) else request
+            key = (name, tuple(sorted(params.items())))
+            if key not in self._frames:
+                pending[key] = (name, params)
+        if len(pending) < 2:
+            for name, params in pending.values():
+                self.get(name, **params)
+            return
+        with st.spinner("Loading data..."), ThreadPoolExecutor(
+            max_workers=min(MAX_CONCURRENT_QUERIES, len(pending))
+        ) as executor:
+            futures = {
+                key: executor.submit(load_dataset, name, **params)
+                for key, (name, params) in pending.items()
+            }
+            for key, future in futures.items():
+                self._frames[key] = future.result()
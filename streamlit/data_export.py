@@ -0,0 +1,190 @@
+import gzip
+import itertools
+import os
+import re
+import secrets
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import streamlit as st
+
+# Download formats: label -> (file suffix, MIME type).
+EXPORT_FORMATS = {
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+}
+
+# Rows per Arrow batch when an in-memory frame is exported.
+EXPORT_BATCH_ROWS = 100_000
+
+# Finished exports are written here and streamed to the browser from disk by the export
+# route (see serve.py), so a download's size never counts against the server's memory.
+EXPORT_DIR = os.environ.get("DASHBOARD_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "dashboard_exports"))
+
+# Path the export route is mounted at.
+EXPORT_ROUTE = "/exports"
+
+# Prepared exports are deleted this many seconds after they were written.
+EXPORT_MAX_AGE_SECONDS = float(os.environ.get("DASHBOARD_EXPORT_MAX_AGE", 3600))
+
+# Export file names are a URL-safe random token and a format suffix.
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_-]+(\.[a-z]+)+")
+
+# gzip level for CSV exports. Level 1 compresses several times faster than Arrow's default
+# of 9 for files under 10% larger, and exports are read once.
+CSV_GZIP_LEVEL = 1
+
+
+def frame_batches(df, rows=EXPORT_BATCH_ROWS):
+    """Yields a DataFrame as Arrow record batches of at most `rows` rows, converting one slice at a time."""
+    for start in range(0, max(len(df), 1), rows):
+        yield pa.RecordBatch.from_pandas(df.iloc[start:start + rows], preserve_index=False)
+
+
+def export_schema(schema):
+    """
+    Returns `schema` with integers widened to int64 and floats to float64.
+
+    Warehouse result chunks may narrow types differently (a later chunk of an INT column
+    can arrive as int16 after a first chunk of int8), so the file's schema cannot be the
+    first chunk's as it arrived.
+    """
+    fields = []
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            field = field.with_type(pa.int64())
+        elif pa.types.is_floating(field.type):
+            field = field.with_type(pa.float64())
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def write_export(batches, export_format, path):
+    """
+    Writes Arrow batches to `path` as a Parquet or gzip CSV file.
+
+    Each batch is encoded and written before the next one is pulled, so memory use is
+    bounded by the batch size rather than by the size of the result. Every batch is cast
+    to the widened schema of the first one (see export_schema()).
+    """
+    batches = iter(batches)
+    first = next(batches, None)
+    schema = export_schema(first.schema) if first is not None else pa.schema([])
+    if export_format == "Parquet":
+        writer = pq.ParquetWriter(path, schema)
+        stream = None
+    else:
+        stream = gzip.open(path, "wb", compresslevel=CSV_GZIP_LEVEL)
+        writer = pacsv.CSVWriter(pa.PythonFile(stream, mode="w"), schema)
+    if first is not None:
+        batches = itertools.chain([first], batches)
+    try:
+        for batch in batches:
+            writer.write(batch if batch.schema == schema else batch.cast(schema))
+    finally:
+        writer.close()
+        if stream is not None:
+            stream.close()
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_exports(max_age=EXPORT_MAX_AGE_SECONDS):
+    """Deletes finished exports older than `max_age` seconds."""
+    now = time.time()
+    with os.scandir(EXPORT_DIR) as it:
+        for entry in it:
+            try:
+                expired = now - entry.stat().st_mtime > max_age
+            except FileNotFoundError:
+                continue
+            if expired:
+                discard(entry.path)
+
+
+def prepare_export(batches, export_format):
+    """
+    Writes the batches to a new file in EXPORT_DIR and returns its token, the unguessable
+    file name the export route serves it under.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    sweep_exports()
+    suffix, _ = EXPORT_FORMATS[export_format]
+    token = f"{secrets.token_urlsafe(16)}{suffix}"
+    path = os.path.join(EXPORT_DIR, token)
+    try:
+        write_export(batches, export_format, path)
+    except BaseException:
+        discard(path)
+        raise
+    return token
+
+
+def export_url(token, file_name):
+    return f"{EXPORT_ROUTE}/{token}/{file_name}"
+
+
+async def serve_export(request):
+    """Streams a finished export from disk in chunks; the browser saves it as `file_name`."""
+    from starlette.responses import FileResponse, PlainTextResponse
+
+    token = request.path_params["token"]
+    path = os.path.join(EXPORT_DIR, token)
+    mimes = [mime for suffix, mime in EXPORT_FORMATS.values() if token.endswith(suffix)]
+    if not TOKEN_PATTERN.fullmatch(token) or not mimes or not os.path.isfile(path):
+        return PlainTextResponse("This export has expired; prepare it again from the dashboard.", status_code=404)
+    return FileResponse(path, media_type=mimes[0], filename=request.path_params["file_name"])
+
+
+def export_routes():
+    """Returns the Starlette routes that serve finished exports (see serve.py)."""
+    from starlette.routing import Route
+
+    return [Route(f"{EXPORT_ROUTE}/{{token}}/{{file_name}}", serve_export)]
+
+
+def exports_served():
+    return os.environ.get("DASHBOARD_SERVE_EXPORTS") == "1"
+
+
+@st.fragment
+def export_download(key, file_stem, batches, label="Download"):
+    """
+    Renders a format picker, a button that prepares an export of the batches returned by
+    `batches()`, and a link to download the prepared file.
+
+    This is a fragment, so preparing an export reruns only these widgets and never the
+    tab around them. The file is served by the export route, which streams it from disk;
+    it never passes through Streamlit's in-memory media store.
+    """
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox(
+            "Export format", list(EXPORT_FORMATS), key=f"{key}_export_format", label_visibility="collapsed"
+        )
+    suffix, _ = EXPORT_FORMATS[export_format]
+    with col2:
+        if not exports_served():
+            st.caption("Downloads are served by `streamlit run serve.py`.")
+            return
+        prepared_key = f"{key}_export_prepared"
+        if st.button(f"Prepare {export_format} export", key=f"{key}_export"):
+            with st.spinner("Exporting..."):
+                token = prepare_export(batches(), export_format)
+            st.session_state[prepared_key] = (export_format, export_url(token, f"{file_stem}{suffix}"))
+        prepared = st.session_state.get(prepared_key)
+        if prepared is not None and prepared[0] == export_format:
+            st.link_button(label, prepared[1])
+
+
+def export_frame(df, key):
+    """Offers `df`, typically the cached dataset the tab already shows, as a download named after `key`."""
+    export_download(key, key, lambda: frame_batches(df))
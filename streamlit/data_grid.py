@@ -0,0 +1,47 @@
+import pandas as pd
+import streamlit as st
+
+# Rows sent to the browser per page of a data table.
+PAGE_SIZE = 50
+
+
+def paged_dataframe(df, key, page_size=PAGE_SIZE):
+    """
+    Displays `df` one page at a time, with sorting and a column filter applied server-side.
+
+    The cached frame is filtered, sorted and sliced in this process and only the visible
+    page is serialized to the browser, so the payload stays bounded however many rows the
+    result holds. Frames that fit on one page are shown as a plain table.
+    """
+    if len(df) <= page_size:
+        st.dataframe(df, width="stretch")
+        return
+
+    col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
+    with col1:
+        sort_by = st.selectbox("Sort by", ["(original order)", *df.columns], key=f"{key}_sort")
+        descending = st.toggle("Descending", key=f"{key}_descending")
+    with col2:
+        filter_column = st.selectbox("Filter column", df.columns, key=f"{key}_filter_column")
+    with col3:
+        filter_text = st.text_input("Contains", key=f"{key}_filter_text")
+
+    view = df
+    if filter_text:
+        values = view[filter_column].astype(str)
+        view = view[values.str.contains(filter_text, case=False, regex=False, na=False)]
+    if sort_by != "(original order)":
+        # Categoricals sort by their labels rather than by dictionary order.
+        view = view.sort_values(
+            sort_by,
+            ascending=not descending,
+            key=lambda column: column.astype(str) if isinstance(column.dtype, pd.CategoricalDtype) else column,
+        )
+
+    total = len(view)
+    pages = max(1, -(-total // page_size))
+    with col4:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    st.dataframe(view.iloc[start:start + page_size], width="stretch")
+    st.caption(f"Rows {min(start + 1, total):,}-{min(start + page_size, total):,} of {total:,}")
@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class TableVersions:
+    """
+    Tracks a cheap change signal (e.g. last-altered time and row count) per source table.
+
+    The signal is re-polled at most every `poll_seconds`, in a background thread, so
+    callers always get the last known versions without waiting on the poll.
+    """
+
+    def __init__(self, poll, poll_seconds):
+        self._poll = poll
+        self._poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._first_poll_lock = threading.Lock()
+        self._versions = None
+        self._polled_at = 0.0
+        self._polling = False
+
+    def get(self):
+        """Returns {table: version}; only the very first poll is waited for, by all its callers."""
+        if self._versions is None:
+            with self._first_poll_lock:
+                if self._versions is None:
+                    self._refresh()
+            return self._versions
+        with self._lock:
+            if not self._polling and time.monotonic() - self._polled_at > self._poll_seconds:
+                self._polling = True
+                threading.Thread(target=self._refresh, daemon=True).start()
+        return self._versions
+
+    def _refresh(self):
+        try:
+            versions = self._poll()
+        except Exception:
+            logger.exception("Polling source table versions failed; keeping the last known versions.")
+            versions = None
+        with self._lock:
+            if versions is not None or self._versions is None:
+                self._versions = versions or {}
+            self._polled_at = time.monotonic()
+            self._polling = False
+
+
+class DatasetStore:
+    """
+    Process-wide dataset cache, shared by every session and keyed by dataset and filters.
+
+    Each entry remembers the source version it was loaded at. When the version moves on,
+    the stale frame keeps being served while one background refresh replaces it, so users
+    only ever wait for the very first load of a key, which concurrent callers share.
+    """
+
+    def __init__(self, max_entries):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def get(self, key, version, load):
+        """
+        Returns (loaded version, frame) for `key`, calling load(previous) to (re)build it at `version`.
+
+        The loaded version differs from `version` while a stale frame is being served.
+        `previous` is the stale frame being replaced, or None on a first load, so loaders
+        can refresh incrementally instead of starting over.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry[0] != version and key not in self._inflight:
+                    self._start(key, version, load, entry[1], background=True)
+                return entry
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._start(key, version, load, None, background=False)
+                owner = True
+            else:
+                owner = False
+        if owner:
+            self._run(key, version, load, None, future)
+        return future.result()
+
+    def _start(self, key, version, load, previous, background):
+        future = Future()
+        self._inflight[key] = future
+        if background:
+            threading.Thread(target=self._run, args=(key, version, load, previous, future), daemon=True).start()
+        return future
+
+    def _run(self, key, version, load, previous, future):
+        try:
+            frame = load(previous)
+        except Exception as e:
+            with self._lock:
+                del self._inflight[key]
+                stale = key in self._entries
+            if stale:
+                logger.exception("Background refresh of %s failed; serving the stale result.", key)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = (version, frame)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+        future.set_result((version, frame))
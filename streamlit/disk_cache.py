@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+# Query results are stored as Parquet files in this directory so they survive restarts and
+# deploys. Point DASHBOARD_CACHE_DIR at a shared volume to let replicas share one cache.
+CACHE_DIR = os.environ.get(
+    "DASHBOARD_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "datasets")
+)
+
+# Least recently used files are evicted once the directory grows past this many bytes.
+MAX_BYTES = int(os.environ.get("DASHBOARD_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Files older than this are treated as misses and re-queried. Dataset keys include the
+# source-table version and a hash of the code building the query, so this only bounds how
+# long results for unchanged tables and queries are trusted.
+MAX_AGE_SECONDS = float(os.environ.get("DASHBOARD_CACHE_MAX_AGE", 7 * 24 * 3600))
+
+
+def cache_key(query, params=None):
+    """Returns the file key for a query (or dataset) identifier and its parameters."""
+    payload = json.dumps([query, list(params or [])], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, f"{key}.parquet")
+
+
+def read(key):
+    """Returns the cached DataFrame for `key`, or None when it is missing or too old."""
+    path = _path(key)
+    try:
+        written_at = os.path.getmtime(path)
+        if time.time() - written_at > MAX_AGE_SECONDS:
+            os.remove(path)
+            return None
+        df = pd.read_parquet(path)
+        # The access time records the last use for LRU eviction; the modification time
+        # keeps recording when the result was written.
+        os.utime(path, (time.time(), written_at))
+    except (OSError, ValueError):
+        # Missing, concurrently evicted or unreadable files are all plain misses.
+        return None
+    return df
+
+
+def write(key, df):
+    """Stores `df` under `key` and evicts old entries if the cache is over MAX_BYTES."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(key)
+    # Write to a temporary file first so readers never see a partially written file. Each
+    # writer gets its own, so threads writing the same key do not clobber each other.
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f"{key}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            df.to_parquet(f, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    evict()
+
+
+def evict(max_bytes=None):
+    """Deletes least recently used files until the cache fits in `max_bytes`."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith(".parquet"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
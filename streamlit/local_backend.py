@@ -0,0 +1,309 @@
+"""
+Local query backend: runs the dashboard's Snowflake SQL with DuckDB over Parquet snapshots.
+
+Snapshots are one Parquet file per target table in DASHBOARD_LOCAL_DATA_DIR. They can be
+exported from Snowflake and scaled up for load testing from the command line:
+
+    python local_backend.py export
+    python local_backend.py scale --factor 10 --out /tmp/snapshots_10x
+"""
+import argparse
+import os
+import re
+import threading
+import time
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from compact_fetch import collect_batches, compact_table
+
+# Directory holding the Parquet snapshots the local backend reads.
+DATA_DIR = os.environ.get(
+    "DASHBOARD_LOCAL_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots"),
+)
+
+# Snowflake table -> snapshot it is read from. The staging table has the same columns as
+# the target it is merged into, so it is served from the target's snapshot.
+SNAPSHOT_TABLES = {
+    "HEALTHCARE.PUBLIC.DAILY_NURSE_STAFFING_TARGET": "daily_nurse_staffing_target",
+    "HEALTHCARE.PUBLIC.NH_PROVIDER_INFO_TARGET": "nh_provider_info_target",
+    "HEALTHCARE.PUBLIC.PROVIDER_QUALITY_REPORTING_TARGET": "provider_quality_reporting_target",
+    "HEALTHCARE.STAGING.NH_PROVIDER_INFO_STAGING": "nh_provider_info_target",
+}
+
+# Hours summed per PBJ provider-day, and the provider-info averages kept as a sum and a
+# count of non-null values, as in snowflake_setup/dashboard_rollups.py.
+_NURSE_HOURS = '"Hrs_RNDON" + "Hrs_RNadmin" + "Hrs_LPNadmin" + "Hrs_LPN" + "Hrs_CNA" + "Hrs_NAtrn" + "Hrs_MedAide"'
+_CONTRACTED_HOURS = '"Hrs_RNDON_ctr" + "Hrs_RNadmin_ctr" + "Hrs_LPNadmin_ctr" + "Hrs_LPN_ctr" + "Hrs_CNA_ctr" + "Hrs_NAtrn_ctr" + "Hrs_MedAide_ctr"'
+_STAFFING_HOURS = f"""
+        COALESCE(SUM({_NURSE_HOURS}), 0) AS TOTALNURSEHOURS,
+        COALESCE(SUM({_CONTRACTED_HOURS}), 0) AS TOTALCONTRACTEDHOURS,
+        COUNT(*) AS ROW_COUNT"""
+_PROVIDER_INFO_AVERAGES = "".join(
+    f"""
+        COALESCE(SUM({column}), 0) AS {name}_SUM,
+        COUNT({column}) AS {name}_COUNT,"""
+    for name, column in [
+        ("RESIDENTS", '"Average Number of Residents per Day"'),
+        ("TOTAL_STAFFING", '"Reported Total Nurse Staffing Hours per Resident per Day"'),
+        ("RN_STAFFING", '"Reported RN Staffing Hours per Resident per Day"'),
+        ("LPN_STAFFING", '"Reported LPN Staffing Hours per Resident per Day"'),
+        ("AIDE_STAFFING", '"Reported Nurse Aide Staffing Hours per Resident per Day"'),
+    ]
+)
+
+# Rollup table -> (view, snapshot it is computed from, defining query). Snowflake maintains
+# these incrementally; locally they are views computed from the snapshots on every read.
+ROLLUP_VIEWS = {
+    **{
+        f"HEALTHCARE.PUBLIC.STAFFING_PROVIDER_{grain}_ROLLUP": (f"staffing_provider_{grain.lower()}_rollup", "daily_nurse_staffing_target", f"""
+        SELECT PROVNUM, PROVNAME, STATE, {period} AS {column},{_STAFFING_HOURS}
+        FROM daily_nurse_staffing_target
+        GROUP BY ALL""")
+        for grain, (column, period) in {
+            # DuckDB weeks start on Monday, as ISO weeks do.
+            "DAY": ("WORKDATE", '"WorkDate"'),
+            "WEEK": ("WORKWEEK", "DATE_TRUNC('week', \"WorkDate\")"),
+            "MONTH": ("WORKMONTH", "DATE_TRUNC('month', \"WorkDate\")"),
+            "QUARTER": ("WORKQUARTER", "DATE_TRUNC('quarter', \"WorkDate\")"),
+        }.items()
+    },
+    "HEALTHCARE.PUBLIC.STAFFING_PROVIDER_ROLLUP": ("staffing_provider_rollup", "daily_nurse_staffing_target", f"""
+        SELECT PROVNUM, PROVNAME, STATE,{_STAFFING_HOURS}
+        FROM daily_nurse_staffing_target
+        GROUP BY ALL"""),
+    "HEALTHCARE.PUBLIC.PROVIDER_INFO_STATE_MONTH_ROLLUP": ("provider_info_state_month_rollup", "nh_provider_info_target", f"""
+        SELECT "State", DATE_TRUNC('month', "Processing Date") AS "ReportingMonth",{_PROVIDER_INFO_AVERAGES}
+        COUNT(*) AS ROW_COUNT
+        FROM nh_provider_info_target
+        GROUP BY ALL"""),
+    "HEALTHCARE.PUBLIC.PROVIDER_INFO_PROVIDER_MONTH_ROLLUP": ("provider_info_provider_month_rollup", "nh_provider_info_target", f"""
+        SELECT "Provider Name", DATE_TRUNC('month', "Processing Date") AS "ReportingMonth",{_PROVIDER_INFO_AVERAGES}
+        COALESCE(SUM("Number of Certified Beds"), 0) AS BEDS_SUM,
+        COALESCE(SUM("Reported Total Nurse Staffing Hours per Resident per Day" * "Average Number of Residents per Day"), 0) AS RESIDENT_STAFFING_HOURS_SUM,
+        COUNT(*) AS ROW_COUNT
+        FROM nh_provider_info_target
+        GROUP BY ALL"""),
+    "HEALTHCARE.PUBLIC.PROVIDER_INFO_MONTH_ROLLUP": ("provider_info_month_rollup", "nh_provider_info_target", """
+        SELECT DATE_TRUNC('month', "Processing Date") AS "ReportingMonth",
+        COALESCE(SUM("Average Number of Residents per Day"), 0) AS RESIDENTS_SUM,
+        COALESCE(SUM("Number of Certified Beds"), 0) AS BEDS_SUM,
+        COUNT(*) AS ROW_COUNT
+        FROM nh_provider_info_target
+        GROUP BY ALL"""),
+    # Snowflake records the days each rollup refresh changed; a snapshot is replaced
+    # whole, so every day in it counts as changed when its file was last written.
+    "HEALTHCARE.PUBLIC.STAFFING_DAY_CHANGES": ("staffing_day_changes", "daily_nurse_staffing_target", """
+        SELECT DISTINCT "WorkDate" AS WORKDATE,
+        (SELECT MODIFIED FROM daily_nurse_staffing_target_modified) AS CHANGED_AT
+        FROM daily_nurse_staffing_target"""),
+}
+
+# Local stand-in for INFORMATION_SCHEMA.TABLES, rebuilt from the snapshot files' mtimes
+# and row counts whenever a query reads it.
+VERSIONS_TABLE = "snapshot_tables"
+
+# Provider identifying columns per snapshot. `scale` suffixes them so that every replica
+# of a provider is a distinct provider.
+PROVIDER_COLUMNS = {
+    "daily_nurse_staffing_target": ["PROVNUM", "PROVNAME"],
+    "nh_provider_info_target": ["CMS Certification Number (CCN)", "Provider Name"],
+    "provider_quality_reporting_target": ["CMS Certification Number (CCN)", "Provider Name"],
+}
+
+# DuckDB macros for the Snowflake functions DuckDB lacks. DATE_TRUNC exists in both.
+MACROS = [
+    "CREATE MACRO DIV0(a, b) AS CASE WHEN b = 0 THEN 0 ELSE a / b END",
+]
+
+# Rows per Arrow batch streamed out of DuckDB.
+BATCH_ROWS = 100_000
+
+_TABLE_PATTERN = re.compile(
+    "|".join(
+        re.escape(table) for table in [*SNAPSHOT_TABLES, *ROLLUP_VIEWS, "HEALTHCARE.INFORMATION_SCHEMA.TABLES"]
+    ),
+    re.IGNORECASE,
+)
+
+# An unquoted alias: "AS name" not followed by "(" (which would be a CTE or a cast type).
+_ALIAS_PATTERN = re.compile(r"\bAS\s+([A-Za-z_][A-Za-z0-9_$]*)\b(?!\s*\()", re.IGNORECASE)
+
+
+def snapshot_path(snapshot, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"{snapshot}.parquet")
+
+
+def to_duckdb(query):
+    """
+    Translates a dashboard query from Snowflake SQL to DuckDB SQL.
+
+    Fully qualified Snowflake tables become the local snapshot and rollup views. Snowflake stores
+    unquoted identifiers in upper case while DuckDB keeps them as written, so unquoted
+    aliases are upper-cased to give result columns the names Snowflake would. Quoted
+    identifiers and bind variables ("?") mean the same in both.
+    """
+    def table(match):
+        name = match.group(0).upper()
+        if name in ROLLUP_VIEWS:
+            return ROLLUP_VIEWS[name][0]
+        return SNAPSHOT_TABLES.get(name, VERSIONS_TABLE)
+
+    query = _TABLE_PATTERN.sub(table, query)
+    return _ALIAS_PATTERN.sub(lambda match: f"AS {match.group(1).upper()}", query)
+
+
+def record_batch_reader(result):
+    """Returns a reader streaming an executed DuckDB result in batches of BATCH_ROWS rows."""
+    if hasattr(result, "to_arrow_reader"):
+        return result.to_arrow_reader(BATCH_ROWS)
+    return result.fetch_record_batch(BATCH_ROWS)
+
+
+class LocalBackend:
+    """Runs dashboard queries with an embedded DuckDB database over Parquet snapshots."""
+
+    label = "local snapshots"
+
+    def __init__(self, data_dir=DATA_DIR):
+        self._data_dir = data_dir
+        self._lock = threading.Lock()
+        self._con = duckdb.connect()
+        for macro in MACROS:
+            self._con.execute(macro)
+        for snapshot in sorted(set(SNAPSHOT_TABLES.values())):
+            path = snapshot_path(snapshot, data_dir).replace("'", "''")
+            self._con.execute(f"CREATE VIEW {snapshot} AS SELECT * FROM read_parquet('{path}')")
+            # Only the file's metadata is read, not its content.
+            self._con.execute(
+                f"CREATE VIEW {snapshot}_modified AS SELECT epoch(last_modified) AS MODIFIED FROM read_blob('{path}')"
+            )
+        for view, _, query in ROLLUP_VIEWS.values():
+            self._con.execute(f"CREATE VIEW {view} AS {query}")
+        self._con.execute(
+            f"CREATE TABLE {VERSIONS_TABLE} (TABLE_CATALOG VARCHAR, TABLE_SCHEMA VARCHAR, "
+            "TABLE_NAME VARCHAR, LAST_ALTERED TIMESTAMP, ROW_COUNT BIGINT)"
+        )
+
+    def check(self):
+        """Fails with the missing paths unless every snapshot exists."""
+        missing = [
+            snapshot_path(snapshot, self._data_dir)
+            for snapshot in sorted(set(SNAPSHOT_TABLES.values()))
+            if not os.path.exists(snapshot_path(snapshot, self._data_dir))
+        ]
+        if missing:
+            raise FileNotFoundError(f"Missing local snapshots: {', '.join(missing)}")
+
+    def _refresh_versions(self, cursor):
+        rows = []
+        # A rollup changes exactly when the snapshot it is computed from does.
+        sources = {**SNAPSHOT_TABLES, **{table: snapshot for table, (_, snapshot, _) in ROLLUP_VIEWS.items()}}
+        for table, snapshot in sources.items():
+            path = snapshot_path(snapshot, self._data_dir)
+            catalog, schema, name = table.split(".")
+            rows.append((
+                catalog,
+                schema,
+                name,
+                time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(os.path.getmtime(path))),
+                pq.ParquetFile(path).metadata.num_rows,
+            ))
+        with self._lock:
+            cursor.execute(f"DELETE FROM {VERSIONS_TABLE}")
+            cursor.executemany(f"INSERT INTO {VERSIONS_TABLE} VALUES (?, ?, ?, ?, ?)", rows)
+
+    def execute(self, query, params, tag):
+        """Runs `query` against the snapshots; returns (compact DataFrame, seconds spent fetching)."""
+        query = to_duckdb(query)
+        # Each thread gets its own cursor (a DuckDB connection to the same database).
+        cursor = self._con.cursor()
+        try:
+            if VERSIONS_TABLE in query:
+                self._refresh_versions(cursor)
+            result = cursor.execute(query, list(params or []))
+            fetch_start = time.perf_counter()
+            reader = record_batch_reader(result)
+            table = pa.Table.from_batches(collect_batches(reader), schema=reader.schema)
+            return compact_table(table), time.perf_counter() - fetch_start
+        finally:
+            cursor.close()
+
+    def stream(self, query, params, tag):
+        """Runs `query` against the snapshots and yields its result as Arrow record batches."""
+        cursor = self._con.cursor()
+        try:
+            reader = record_batch_reader(cursor.execute(to_duckdb(query), list(params or [])))
+            empty = True
+            for batch in reader:
+                empty = False
+                yield batch
+            if empty:
+                # An empty result still carries its columns, e.g. for a CSV header.
+                yield pa.RecordBatch.from_pylist([], schema=reader.schema)
+        finally:
+            cursor.close()
+
+    def close(self):
+        self._con.close()
+
+
+def export_snapshots(out_dir):
+    """Writes every target table from Snowflake to a Parquet snapshot, streaming batch by batch."""
+    from connection import get_connection_pool
+
+    os.makedirs(out_dir, exist_ok=True)
+    with get_connection_pool().connection() as conn, conn.cursor() as cursor:
+        for table, snapshot in SNAPSHOT_TABLES.items():
+            if "STAGING" in table:
+                continue
+            cursor.execute(f"SELECT * FROM {table}")
+            writer = None
+            for batch in cursor.fetch_arrow_batches():
+                writer = writer or pq.ParquetWriter(snapshot_path(snapshot, out_dir), batch.schema)
+                writer.write_table(batch)
+            if writer is not None:
+                writer.close()
+            print(f"Exported {table} to {snapshot_path(snapshot, out_dir)}")
+
+
+def scale_snapshots(source_dir, out_dir, factor):
+    """
+    Writes `factor` copies of every snapshot into `out_dir`, each copy as new providers.
+
+    Copy i > 0 appends " #i" to the provider identifying columns, so the scaled data has
+    `factor` times the rows and `factor` times the providers.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for snapshot, columns in PROVIDER_COLUMNS.items():
+        table = pq.read_table(snapshot_path(snapshot, source_dir))
+        with pq.ParquetWriter(snapshot_path(snapshot, out_dir), table.schema) as writer:
+            for i in range(factor):
+                copy = table
+                if i:
+                    for column in columns:
+                        position = copy.schema.get_field_index(column)
+                        suffixed = pc.binary_join_element_wise(copy[column].cast(pa.string()), f" #{i}", "")
+                        copy = copy.set_column(position, column, suffixed.cast(copy.schema.field(column).type))
+                writer.write_table(copy)
+        print(f"Wrote {factor}x {snapshot} ({factor * table.num_rows:,} rows) to {out_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local backend's Parquet snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Export the target tables from Snowflake.")
+    export.add_argument("--out", default=DATA_DIR)
+    scale = commands.add_parser("scale", help="Replicate snapshots as new providers for load testing.")
+    scale.add_argument("--factor", type=int, required=True)
+    scale.add_argument("--source", default=DATA_DIR)
+    scale.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshots(args.out)
+    else:
+        scale_snapshots(args.source, args.out, args.factor)
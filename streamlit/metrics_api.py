@@ -0,0 +1,255 @@
+"""
+Read-only HTTP API serving the dashboard's datasets to other consumers as JSON or Arrow.
+
+Datasets come from dashboard_data.load_dataset(), so the API runs the dashboard's own
+queries through the same memory, disk and warehouse tiers, and concurrent identical
+requests share one warehouse query. Responses carry an ETag derived from the source
+tables' versions, so revalidating an unchanged dataset costs no query at all.
+
+    python metrics_api.py --port 8502
+    curl 'http://localhost:8502/datasets/nurse_hours.json?state=CA&state=NY&grain=quarter'
+    curl 'http://localhost:8502/datasets/occupancy_rate.arrow' > occupancy_rate.arrows
+
+Set DASHBOARD_BACKEND=local to serve the local snapshots instead of Snowflake.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pyarrow as pa
+from dashboard_data import (
+    FALLBACK_TTL_SECONDS,
+    RANK_LEVELS,
+    TIME_GRAINS,
+    VERSION_POLL_SECONDS,
+    dataset_params,
+    load_dataset,
+    source_version,
+)
+
+# Datasets served by the API and the query-string parameters each accepts.
+API_DATASETS = {
+    "state": (),
+    "provider": (),
+    "nurse_hours_filter_options": (),
+    "nurse_hours": ("state", "provider", "grain"),
+    "nurse_hours_ranked": ("state", "provider", "n", "level"),
+    "contract_hours": ("state", "provider", "n", "level"),
+    "occupancy_rate": (),
+    "bed_utilization": (),
+    "staffing_occupancy": (),
+    "hospital_throughput": (),
+    "provider_staffing": (),
+}
+
+# Filter query-string parameter -> dataset loader argument.
+FILTER_ARGUMENTS = {"state": "states", "provider": "providers"}
+
+# Response formats: file suffix -> Content-Type.
+FORMATS = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Encoded response bodies kept per process, keyed by ETag, so repeated requests skip encoding.
+MAX_BODY_CACHE_BYTES = int(os.environ.get("DASHBOARD_API_BODY_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+class BadRequest(Exception):
+    """Raised for a request the API cannot answer, with the HTTP status to answer it with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class BodyCache:
+    """Thread-safe LRU of encoded response bodies, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bodies = OrderedDict()
+        self._bytes = 0
+
+    def get(self, etag):
+        with self._lock:
+            body = self._bodies.get(etag)
+            if body is not None:
+                self._bodies.move_to_end(etag)
+            return body
+
+    def put(self, etag, body):
+        if len(body) > self._max_bytes:
+            return
+        with self._lock:
+            if etag in self._bodies:
+                return
+            self._bodies[etag] = body
+            self._bytes += len(body)
+            while self._bytes > self._max_bytes:
+                _, evicted = self._bodies.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+_body_cache = BodyCache(MAX_BODY_CACHE_BYTES)
+
+
+def parse_request(path):
+    """Returns (dataset, format, loader params) for a /datasets/<name>.<format>?<filters> path."""
+    url = urlsplit(path)
+    prefix, _, resource = url.path.rpartition("/")
+    name, _, response_format = resource.partition(".")
+    if prefix != "/datasets" or name not in API_DATASETS:
+        raise BadRequest(404, f"Unknown dataset {url.path!r}; see /datasets.")
+    if response_format not in FORMATS:
+        raise BadRequest(404, f"Unknown format {response_format!r}; expected one of {', '.join(FORMATS)}.")
+
+    params = {}
+    for key, values in parse_qs(url.query).items():
+        if key not in API_DATASETS[name]:
+            raise BadRequest(400, f"{name} does not take {key!r}; it takes {list(API_DATASETS[name])}.")
+        if key in FILTER_ARGUMENTS:
+            # Sorted, as the dashboard sends them, so equal filters share a cache entry.
+            params[FILTER_ARGUMENTS[key]] = tuple(sorted(set(values)))
+        elif key == "n":
+            if not values[-1].isdigit() or int(values[-1]) < 1:
+                raise BadRequest(400, f"n must be a positive integer, not {values[-1]!r}.")
+            params["n"] = int(values[-1])
+        elif key == "grain":
+            if values[-1] not in TIME_GRAINS:
+                raise BadRequest(400, f"grain must be one of {list(TIME_GRAINS)}, not {values[-1]!r}.")
+            params["grain"] = values[-1]
+        else:
+            if values[-1] not in RANK_LEVELS:
+                raise BadRequest(400, f"level must be one of {list(RANK_LEVELS)}, not {values[-1]!r}.")
+            params["level"] = values[-1]
+    return name, response_format, params
+
+
+def etag(name, params, version, response_format):
+    payload = json.dumps([name, params, version, response_format], default=str)
+    return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(tag, if_none_match):
+    """True when an If-None-Match header value lists `tag` (weak or strong) or is "*"."""
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or tag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+
+def cache_control(version, current_version):
+    """
+    Returns the Cache-Control header for a dataset served at `version`.
+
+    Source changes are noticed within VERSION_POLL_SECONDS, so clients may reuse a current
+    response for that long. Datasets whose sources have no version signal expire with
+    their TTL bucket, and a stale response being refreshed must be revalidated.
+    """
+    if version != current_version:
+        return "no-cache"
+    if version[0] == "ttl":
+        return f"public, max-age={FALLBACK_TTL_SECONDS - int(time.time()) % FALLBACK_TTL_SECONDS}"
+    return f"public, max-age={VERSION_POLL_SECONDS}"
+
+
+def encode(df, response_format):
+    if response_format == "json":
+        return df.to_json(orient="records", date_format="iso").encode("utf-8")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answers GET and HEAD requests for /datasets, /datasets/<name>.<format> and /health."""
+
+    server_version = "NursingHomeMetrics/1.0"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        try:
+            status, headers, body = self._handle()
+        except BadRequest as e:
+            status, headers, body = e.status, {}, json.dumps({"error": str(e)}).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        except Exception as e:
+            self.log_error("Loading %s failed: %r", self.path, e)
+            status, headers = 500, {"Content-Type": "application/json"}
+            body = json.dumps({"error": f"Loading the dataset failed: {type(e).__name__}"}).encode("utf-8")
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _handle(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            return 200, {"Content-Type": "application/json"}, b'{"status": "ok"}'
+        if path in ("/datasets", "/datasets/"):
+            listing = {name: {"params": list(accepted), "formats": list(FORMATS)} for name, accepted in API_DATASETS.items()}
+            return 200, {"Content-Type": "application/json"}, json.dumps(listing).encode("utf-8")
+
+        name, response_format, params = parse_request(self.path)
+        try:
+            key = dataset_params(name, params)
+        except TypeError as e:
+            raise BadRequest(400, str(e))
+
+        # An unchanged dataset is confirmed from the source versions alone, without loading it.
+        if_none_match = self.headers.get("If-None-Match", "")
+        current_version = source_version(name)
+        current_etag = etag(name, key, current_version, response_format)
+        if etag_matches(current_etag, if_none_match):
+            return 304, {"ETag": current_etag, "Cache-Control": cache_control(current_version, current_version)}, b""
+
+        # While a refresh is running this is the stale frame, which the client may already have.
+        version, df = load_dataset(name, **params)
+        tag = etag(name, key, version, response_format)
+        if etag_matches(tag, if_none_match):
+            return 304, {"ETag": tag, "Cache-Control": cache_control(version, current_version)}, b""
+        body = _body_cache.get(tag)
+        if body is None:
+            body = encode(df, response_format)
+            _body_cache.put(tag, body)
+        headers = {
+            "Content-Type": FORMATS[response_format],
+            "ETag": tag,
+            "Cache-Control": cache_control(version, current_version),
+        }
+        return 200, headers, body
+
+
+def serve(host, port):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    print(f"Serving dashboard datasets on http://{host}:{server.server_port}/datasets", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the dashboard's datasets over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,101 @@
+import os
+
+import streamlit as st
+from backends import BACKEND
+from query_log import QUERY_TAG_PREFIX, get_query_log, timed_import
+
+# The Performance page is hidden from the navigation unless this is set or the URL has ?performance=1.
+SHOW_PERFORMANCE_PAGE = os.environ.get("DASHBOARD_SHOW_PERFORMANCE") == "1"
+
+# Measurements recorded with warehouse query events. Failed queries record only an error
+# and streamed queries no fetch time, so any of them may be missing from the log.
+QUERY_MEASUREMENTS = ["fetch_seconds", "rows", "bytes", "error"]
+
+
+def performance_page_enabled():
+    return SHOW_PERFORMANCE_PAGE or st.query_params.get("performance") == "1"
+
+
+def latency_summary(events):
+    """Summarizes timing events per name: count and p50/p95/max wall time in seconds."""
+    grouped = events.groupby("name")["seconds"]
+    summary = grouped.agg(
+        count="count",
+        p50=lambda s: s.quantile(0.5),
+        p95=lambda s: s.quantile(0.95),
+        max="max",
+    )
+    return summary.sort_values("p95", ascending=False)
+
+
+def query_summary(queries):
+    """Adds median fetch time, rows and bytes and the error count to latency_summary() of query events."""
+    queries = queries.reindex(columns=queries.columns.union(QUERY_MEASUREMENTS, sort=False))
+    summary = latency_summary(queries)
+    per_query = queries.groupby("name")
+    summary["fetch p50"] = per_query["fetch_seconds"].quantile(0.5)
+    summary["rows p50"] = per_query["rows"].quantile(0.5)
+    summary["bytes p50"] = per_query["bytes"].quantile(0.5)
+    summary["errors"] = per_query["error"].count()
+    return summary
+
+
+def performance_metrics():
+    """Displays p50/p95 latency per warehouse query, dataset request and tab for this process."""
+    st.header("Performance")
+    st.markdown(
+        "Latency recorded by this server process since it started (most recent "
+        f"events only). Warehouse queries are tagged `QUERY_TAG = '{QUERY_TAG_PREFIX}:<query>'` "
+        "and can be joined to `SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY`."
+    )
+    events = get_query_log().frame()
+    if events.empty:
+        st.info("No queries or tab renders have been recorded yet.")
+        return
+
+    st.subheader("Tabs")
+    st.caption("Time to load the open tab's data and render it, in seconds.")
+    tabs = events[events["kind"] == "tab"]
+    st.dataframe(latency_summary(tabs), width="stretch")
+
+    st.subheader("Imports")
+    st.caption("Modules loaded on first use after the page shell rendered, in seconds, including the modules they import.")
+    imports = events[events["kind"] == "import"]
+    st.dataframe(imports.groupby("name")["seconds"].max().sort_values(ascending=False), width="stretch")
+
+    st.subheader("Warehouse queries")
+    st.caption("Wall time includes waiting for a pooled connection; fetch time is spent streaming the result.")
+    queries = events[events["kind"] == "query"]
+    if not queries.empty:
+        st.dataframe(query_summary(queries), width="stretch")
+
+    st.subheader("Dataset requests")
+    st.caption("Share of requests answered by each cache tier: memory, stale (served while refreshing), disk or warehouse.")
+    datasets = events[events["kind"] == "dataset"]
+    if not datasets.empty:
+        summary = latency_summary(datasets)
+        tiers = datasets.groupby("name")["cache"].value_counts(normalize=True).unstack(fill_value=0)
+        st.dataframe(summary.join(tiers), width="stretch")
+
+
+def clustering_metrics():
+    """Displays the clustering health of the target tables and how well each dashboard query prunes."""
+    st.subheader("Clustering and pruning")
+    if BACKEND != "snowflake":
+        st.info("Clustering and partition pruning are only reported for the Snowflake backend.")
+        return
+    # Both reports query the warehouse (and ACCOUNT_USAGE), so they only run on request.
+    if not st.button("Load clustering report"):
+        return
+    report = timed_import("clustering_report")
+    st.caption(
+        "Partition depth and overlap of each target table's declared clustering key. "
+        "An average depth near 1 means a value of the key lives in few micro-partitions."
+    )
+    st.dataframe(report.load_clustering_information(), width="stretch")
+    st.caption(
+        f"Partitions scanned out of the partitions total of each dashboard query over the last "
+        f"{report.PRUNING_HISTORY_DAYS} days. A ratio near 1 on a table of many partitions means "
+        "the query's filters are not pruning."
+    )
+    st.dataframe(report.load_pruning_history(), width="stretch")
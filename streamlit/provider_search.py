@@ -0,0 +1,127 @@
+from bisect import bisect_left, bisect_right
+from functools import reduce
+
+import numpy as np
+import streamlit as st
+
+# Returned by provider_picker() when "All providers" is ticked. Like normalize_filter(),
+# "all" is represented as no filter at all rather than as an explicit list of names.
+ALL_PROVIDERS = None
+
+# Matches shown per page of search results.
+PAGE_SIZE = 20
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ProviderIndex:
+    """
+    In-memory search index over provider names and CMS Certification Numbers (CCN).
+
+    Queries shorter than three characters are answered as name prefixes by binary search
+    over the sorted names; longer queries intersect sorted trigram posting arrays and match
+    anywhere in the name. CCNs are matched by prefix.
+    """
+
+    def __init__(self, names, ccns=None):
+        self.names = sorted({name for name in names if isinstance(name, str)})
+        self._lower = [name.lower() for name in self.names]
+        self._lower_array = np.array(self._lower, dtype=str)
+        positions = {name: i for i, name in enumerate(self.names)}
+
+        postings = {}
+        for i, name in enumerate(self._lower):
+            for gram in trigrams(name):
+                postings.setdefault(gram, []).append(i)
+        self._trigrams = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        self._ccns = []
+        if ccns is not None:
+            self._ccns = sorted({
+                (str(ccn).lower(), positions[name])
+                for name, ccn in zip(names, ccns)
+                if isinstance(name, str) and ccn is not None
+            })
+        self._ccn_keys = [ccn for ccn, _ in self._ccns]
+
+    def _by_prefix(self, keys, prefix):
+        return bisect_left(keys, prefix), bisect_right(keys, prefix + "\uffff")
+
+    def search(self, query, offset=0, limit=PAGE_SIZE):
+        """Returns (names on the requested page, total number of matches) in name order."""
+        query = query.strip().lower()
+        if not query:
+            return self.names[offset:offset + limit], len(self.names)
+
+        if len(query) < 3:
+            start, stop = self._by_prefix(self._lower, query)
+            matches = np.arange(start, stop, dtype=np.int32)
+        else:
+            postings = [self._trigrams.get(gram) for gram in trigrams(query)]
+            if any(posting is None for posting in postings):
+                matches = np.empty(0, dtype=np.int32)
+            else:
+                postings.sort(key=len)
+                matches = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), postings)
+                if len(query) > 3:
+                    # Sharing every trigram does not guarantee the trigrams are contiguous.
+                    matches = matches[np.char.find(self._lower_array[matches], query) >= 0]
+
+        start, stop = self._by_prefix(self._ccn_keys, query)
+        if stop > start:
+            ccn_matches = np.array([position for _, position in self._ccns[start:stop]], dtype=np.int32)
+            matches = np.union1d(matches, ccn_matches)
+
+        return [self.names[i] for i in matches[offset:offset + limit]], len(matches)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_provider_index(dataset, version, _names, _ccns=None):
+    """Builds the index for a dataset once per source version and shares it across sessions."""
+    return ProviderIndex(list(_names), None if _ccns is None else list(_ccns))
+
+
+def picker_selection(key, default=None):
+    """
+    Returns what provider_picker() with this `key` and `default` will return on this run,
+    from its widgets' session state, without rendering it.
+    """
+    if not st.session_state.get(f"{key}_all", default is None):
+        selected = st.session_state.get(f"{key}_selected", list(default or []))
+        return tuple(sorted(st.session_state.get(f"{key}_multiselect", selected)))
+    return ALL_PROVIDERS
+
+
+def provider_picker(index, key, default=None):
+    """
+    Renders a searchable, paginated provider selector.
+
+    Returns ALL_PROVIDERS while "All providers" is ticked, otherwise a sorted tuple of the
+    chosen names. Only the current page of matches is ever sent to the browser. `default`
+    pre-selects names and unticks "All providers" the first time the picker is shown.
+    """
+    selected_key = f"{key}_selected"
+    if selected_key not in st.session_state:
+        st.session_state[selected_key] = list(default or [])
+
+    if st.checkbox("All providers", value=default is None, key=f"{key}_all"):
+        return ALL_PROVIDERS
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Search providers by name or CCN", key=f"{key}_query")
+    _, total = index.search(query, 0, 0)
+    pages = max(1, -(-total // PAGE_SIZE))
+    with col2:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    matches, _ = index.search(query, (page - 1) * PAGE_SIZE, PAGE_SIZE)
+    st.caption(f"{total:,} matching providers")
+
+    # Keep earlier picks selectable while the search text and page change.
+    selected = st.session_state[selected_key]
+    options = sorted(set(selected) | set(matches))
+    selected = st.multiselect("Select Provider(s)", options, default=selected, key=f"{key}_multiselect")
+    st.session_state[selected_key] = selected
+    return tuple(sorted(selected))
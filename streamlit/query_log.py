@@ -0,0 +1,72 @@
+import importlib
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import streamlit as st
+
+# Most recent timing events kept per process for the Performance page.
+MAX_RECORDED_EVENTS = 10000
+
+# Prefix of the Snowflake QUERY_TAG set on every dashboard query, for joining to QUERY_HISTORY.
+QUERY_TAG_PREFIX = "nursing_home_dashboard"
+
+
+class QueryLog:
+    """
+    Thread-safe, bounded log of timing events shared by every session of the process.
+
+    Each event has a `kind` ("query" for a warehouse execution, "dataset" for a dataset
+    request and the cache tier that answered it, "tab" for rendering a tab, "import" for
+    loading a module), a `name`, its wall time in seconds and any extra measurements.
+    """
+
+    def __init__(self, max_events):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=max_events)
+
+    def record(self, kind, name, seconds, **fields):
+        event = dict(kind=kind, name=name, seconds=seconds, at=time.time(), **fields)
+        with self._lock:
+            self._events.append(event)
+
+    def frame(self):
+        # pandas is imported here so the app shell can log events before pandas is loaded.
+        import pandas as pd
+
+        with self._lock:
+            events = list(self._events)
+        return pd.DataFrame(events, columns=None if events else ["kind", "name", "seconds", "at"])
+
+
+@st.cache_resource(show_spinner=False)
+def get_query_log():
+    return QueryLog(MAX_RECORDED_EVENTS)
+
+
+def query_tag(name):
+    """Returns the QUERY_TAG for registry query `name`."""
+    return f"{QUERY_TAG_PREFIX}:{name}"
+
+
+@contextmanager
+def timed(kind, name, **fields):
+    """Records the wall time of the enclosed block as a `kind` event called `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_query_log().record(kind, name, time.perf_counter() - start, **fields)
+
+
+def timed_import(module):
+    """Imports `module`, recording how long it took as an "import" event if it was not loaded yet."""
+    # import_module also waits for a module another session is still importing.
+    loaded = module in sys.modules
+    start = time.perf_counter()
+    imported = importlib.import_module(module)
+    if not loaded:
+        get_query_log().record("import", module, time.perf_counter() - start)
+    return imported
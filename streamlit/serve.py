@@ -0,0 +1,19 @@
+"""
+Runs the dashboard together with the route its exports are downloaded from.
+
+    streamlit run serve.py
+    uvicorn serve:app --port 8501
+
+Exports are written to disk and streamed to the browser by the route (see data_export.py),
+so a download of any size never has to fit in the server's memory. Under
+`streamlit run app.py` the tabs show no download links.
+"""
+import os
+
+import streamlit as st
+from data_export import export_routes
+
+# Read by data_export.exports_served() in the app's script runs, which happen in this process.
+os.environ["DASHBOARD_SERVE_EXPORTS"] = "1"
+
+app = st.App(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"), routes=export_routes())
@@ -1,263 +1,391 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from charts import cached_figure, scale_aware_scatter
+from data_export import export_download, export_frame
+from data_grid import paged_dataframe
+from query_log import timed
+from dashboard_data import TIME_GRAINS, normalize_filter, stream_daily_staffing_rows
+from provider_search import ALL_PROVIDERS, get_provider_index, picker_selection, provider_picker
+
+# Datasets each tab renders. The open tab's datasets are fetched together, concurrently.
+TAB_DATASETS = {
+    "state_tab": ["state"],
+    "provider_tab": ["provider"],
+    # The filter tabs also read their filtered datasets; see tab_requests().
+    "nurse_hours_tab": ["nurse_hours_filter_options"],
+    "contracting_hours_tab": ["nurse_hours_filter_options"],
+}
+
+# Providers drawn individually in the nurse-hours provider chart; the rest are shown as "Other".
+TOP_PROVIDERS = 20
+
+# Time grains offered by the Nurse Hours tab (see dashboard_data.TIME_GRAINS) and their labels.
+GRAIN_LABELS = {"day": "Day", "week": "Week", "month": "Month", "quarter": "Quarter"}
+DEFAULT_GRAIN = "month"
+
+
+def current_filters(key):
+    """
+    Returns the filters staffing_filters() will return for `key` on this run, read from
+    its widgets' session state, so the filtered datasets can be requested before the
+    filter options have rendered those widgets.
 
-def staffing_metrics(state_df, provider_df, nurse_hours_df, contracting_hours_df):
+    On a first visit the widgets are unset and their defaults (every state, all providers)
+    apply. Should the guess differ from what the widgets return, the tab simply loads the
+    right dataset when it asks for it.
+    """
+    states = None
+    selected_states = st.session_state.get(f"{key}_states")
+    all_states = st.session_state.get(f"{key}_all_states")
+    if selected_states is not None and all_states is not None:
+        states = normalize_filter(selected_states, all_states)
+    return dict(states=states, providers=picker_selection(f"{key}_providers"))
+
+
+def tab_requests(tab):
+    """Returns every dataset request the open tab makes on this run, so they are all fetched together."""
+    if tab == "nurse_hours_tab":
+        filters = current_filters("nurse_hours")
+        grain = st.session_state.get("nurse_hours_grain", DEFAULT_GRAIN)
+        return [
+            *TAB_DATASETS[tab],
+            ("nurse_hours", dict(filters, grain=grain)),
+            ("nurse_hours_ranked", dict(filters, n=TOP_PROVIDERS)),
+        ]
+    if tab == "contracting_hours_tab":
+        return [*TAB_DATASETS[tab], ("contract_hours", current_filters("contract_hours"))]
+    return TAB_DATASETS[tab]
+
+
+def staffing_metrics(data):
     """
     Displays the Staffing Metrics Dashboard with State-level and Provider-level data.
+
+    Only the open tab is rendered, so only the datasets it needs are loaded from `data`.
     """
     st.header("Staffing Metrics")
-    state_tab, provider_tab, nurse_hours_tab, contracting_hours_tab = st.tabs(["State - Resident Nurse Ratio", "Provider - Resident Nurse Ratio", "Nurse Hours", "Contract Hours"])
-
-    with state_tab:
-        st.header("State-level Aggregation")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Chart 1: Average Residents per Day by State
-            st.subheader("Average Residents per Day by State")
-            fig1 = px.bar(
+    state_tab, provider_tab, nurse_hours_tab, contracting_hours_tab = st.tabs(["State - Resident Nurse Ratio", "Provider - Resident Nurse Ratio", "Nurse Hours", "Contract Hours"], on_change="rerun", key="staffing_metrics_tab")
+
+    if state_tab.open:
+        with timed("tab", "state_tab"):
+            data.prefetch(tab_requests("state_tab"))
+            with state_tab:
+                state_tab_view(data.get("state"), data.version("state"))
+
+    if provider_tab.open:
+        with timed("tab", "provider_tab"):
+            data.prefetch(tab_requests("provider_tab"))
+            with provider_tab:
+                provider_tab_view(data.get("provider"), data.version("provider"))
+
+    if nurse_hours_tab.open:
+        with timed("tab", "nurse_hours_tab"):
+            data.prefetch(tab_requests("nurse_hours_tab"))
+            with nurse_hours_tab:
+                nurse_hours_tab_view(data, data.get("nurse_hours_filter_options"), data.version("nurse_hours_filter_options"))
+
+    if contracting_hours_tab.open:
+        with timed("tab", "contracting_hours_tab"):
+            data.prefetch(tab_requests("contracting_hours_tab"))
+            with contracting_hours_tab:
+                contracting_hours_tab_view(data, data.get("nurse_hours_filter_options"), data.version("nurse_hours_filter_options"))
+
+
+def state_tab_view(state_df, version):
+    st.header("State-level Aggregation")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # Chart 1: Average Residents per Day by State
+        st.subheader("Average Residents per Day by State")
+        fig1 = cached_figure(
+            ("residents_by_state", version),
+            lambda: px.bar(
                 state_df,
                 x="State",
                 y="Average Residents Per Day",
                 title="Average Residents Per Day by State",
                 color="State"
-            )
-            st.plotly_chart(fig1, use_container_width=True)
-        
-        with col2:
-            # Chart 2: Residents to Total Nurse Ratio by State
-            st.subheader("Residents to Total Nurse Ratio by State")
-            fig2 = px.bar(
+            ),
+        )
+        st.plotly_chart(fig1, width="stretch")
+
+    with col2:
+        # Chart 2: Residents to Total Nurse Ratio by State
+        st.subheader("Residents to Total Nurse Ratio by State")
+        fig2 = cached_figure(
+            ("nurse_ratio_by_state", version),
+            lambda: px.bar(
                 state_df,
                 x="State",
                 y="Residents to Total Nurse Ratio",
                 title="Average Residents to Total Nurse Ratio",
                 color="State"
-            )
-            st.plotly_chart(fig2, use_container_width=True)
-
-        # Chart 3: Nurse Staffing Hours Distribution
-        st.subheader("Distribution of Nurse Staffing Hours")
-        staffing_cols = [
-            "Average RN Staffing Hours",
-            "Average LPN Staffing Hours",
-            "Average Nurse Aide Staffing Hours"
-        ]
-        staffing_df_sum = state_df[staffing_cols].sum().reset_index()
-        staffing_df_sum.columns = ['Type', 'Hours']
-        fig3 = px.pie(
+            ),
+        )
+        st.plotly_chart(fig2, width="stretch")
+
+    # Chart 3: Nurse Staffing Hours Distribution
+    st.subheader("Distribution of Nurse Staffing Hours")
+    staffing_cols = [
+        "Average RN Staffing Hours",
+        "Average LPN Staffing Hours",
+        "Average Nurse Aide Staffing Hours"
+    ]
+    staffing_df_sum = state_df[staffing_cols].sum().reset_index()
+    staffing_df_sum.columns = ['Type', 'Hours']
+    fig3 = cached_figure(
+        ("staffing_hours_by_type", version),
+        lambda: px.pie(
             staffing_df_sum,
             values='Hours',
             names='Type',
             title='Total Nurse Staffing Hours by Type Across All States'
-        )
-        st.plotly_chart(fig3, use_container_width=True)
-
-        # Display the data table for state-level data
-        st.markdown("---")
-        st.subheader("State-level Data Table")
-        st.dataframe(state_df, use_container_width=True)
-
-        st.markdown("""_**Conclusion:**_ The first two charts show that New York has the highest average residents per day and the highest resident-to-nurse staffing hours ratio, indicating that nurses in New York care for more residents than in other states. The distribution chart highlights that nurse aide staffing hours exceed those of both RNs and LPNs. The data table provides detailed information on average staffing hours and the resident-to-staffing-hour ratios.""")
+        ),
+    )
+    st.plotly_chart(fig3, width="stretch")
+
+    # Display the data table for state-level data
+    st.markdown("---")
+    st.subheader("State-level Data Table")
+    paged_dataframe(state_df, key="state_table")
+    export_frame(state_df, key="state")
+
+    st.markdown("""_**Conclusion:**_ The first two charts show that New York has the highest average residents per day and the highest resident-to-nurse staffing hours ratio, indicating that nurses in New York care for more residents than in other states. The distribution chart highlights that nurse aide staffing hours exceed those of both RNs and LPNs. The data table provides detailed information on average staffing hours and the resident-to-staffing-hour ratios.""")
+
+
+def provider_tab_view(provider_df, version):
+    st.header("Provider-level Aggregation")
+
+    # Add a filter for providers
+    index = get_provider_index("provider", version, provider_df['Provider Name'])
+    selected_providers = provider_picker(
+        index,
+        key="provider_tab",
+        default=index.names[:10]  # Show first 10 providers by default
+    )
+
+    if selected_providers is not ALL_PROVIDERS and not selected_providers:
+        st.warning("Please select at least one provider.")
+    else:
+        filtered_provider_df = provider_df
+        if selected_providers is not ALL_PROVIDERS:
+            filtered_provider_df = provider_df[provider_df['Provider Name'].isin(selected_providers)]
 
-    with provider_tab:
-        st.header("Provider-level Aggregation")
+        col1, col2 = st.columns(2)
 
-        # Add a filter for providers
-        provider_names = sorted(provider_df['Provider Name'].unique())
-        selected_providers = st.multiselect(
-            "Select Provider(s) to view:",
-            options=provider_names,
-            default=provider_names[:10]  # Show first 10 providers by default
-        )
-        
-        if not selected_providers:
-            st.warning("Please select at least one provider.")
-        else:
-            filtered_provider_df = provider_df[provider_df['Provider Name'].isin(selected_providers)]
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Chart 1: Average Residents per Day by Provider
-                st.subheader("Average Residents per Day by Provider")
-                fig4 = px.bar(
+        with col1:
+            # Chart 1: Average Residents per Day by Provider
+            st.subheader("Average Residents per Day by Provider")
+            fig4 = cached_figure(
+                ("residents_by_provider", version, selected_providers),
+                lambda: px.bar(
                     filtered_provider_df,
                     x="Provider Name",
                     y="Average Residents Per Day",
                     title="Average Residents Per Day",
                     color="Provider Name"
-                )
-                st.plotly_chart(fig4, use_container_width=True)
+                ),
+            )
+            st.plotly_chart(fig4, width="stretch")
 
-            with col2:
-                # Chart 2: Residents to Total Nurse Ratio by Provider
-                st.subheader("Residents to Total Nurse Ratio by Provider")
-                fig5 = px.bar(
+        with col2:
+            # Chart 2: Residents to Total Nurse Ratio by Provider
+            st.subheader("Residents to Total Nurse Ratio by Provider")
+            fig5 = cached_figure(
+                ("nurse_ratio_by_provider", version, selected_providers),
+                lambda: px.bar(
                     filtered_provider_df,
                     x="Provider Name",
                     y="Residents to Total Nurse Ratio",
                     title="Residents to Total Nurse Ratio",
                     color="Provider Name"
-                )
-                st.plotly_chart(fig5, use_container_width=True)
-
-            # Chart 3: Scatter Plot - Residents vs. Total Nurse Staffing
-            st.subheader("Residents vs. Total Nurse Staffing Hours")
-            fig6 = px.scatter(
-                filtered_provider_df,
-                x="Average Residents Per Day",
-                y="Average Total Nurse Staffing Hours",
-                hover_name="Provider Name",
-                title="Residents vs. Total Nurse Staffing Hours"
+                ),
             )
-            st.plotly_chart(fig6, use_container_width=True)
-
-            # Display the data table for provider-level data
-            st.markdown("---")
-            st.subheader("Provider-level Data Table")
-            st.dataframe(filtered_provider_df, use_container_width=True)
-
-            st.markdown("""_**Conclusion:**_ The first two bar charts show that A Holly Patterson Extended Care Facility has the highest average residents per day 
-                        and the highest resident-to-nurse staffing hours ratio, suggesting potential nurse 
-                        overwork and a possible need for additional staff. However, this could also point to data quality issues. 
-                        The Residents vs. Total Nurse Staffing Hours scatter plot does not indicate a clear correlation, as the data points are widely dispersed. The accompanying data table provides detailed insights into daily resident counts and staffing hours.
-                        """)
-
-    
-    with nurse_hours_tab:
-        st.title("Daily Nurse Staffing Analysis")
-        st.markdown("Use the filters below to analyze total nurse hours by provider, state, and month.")
-
-        # --- Filters on the Main Page ---
-        st.header("Filter Data")
-        df = nurse_hours_df
-        # Get unique values for filters
-        all_states = sorted(df['STATE'].unique())
-        selected_states = st.multiselect("Select State(s)", all_states, default=all_states)
-
-        # Filter providers based on selected states
-        filtered_providers = df[df['STATE'].isin(selected_states)]['PROVNAME'].unique()
-        all_providers = sorted(df['PROVNAME'].unique())
-        selected_providers = st.multiselect("Select Provider(s)", all_providers, default=all_providers)
-
-        # --- Apply Filters ---
-        filtered_df = df[
-            df['STATE'].isin(selected_states) &
-            df['PROVNAME'].isin(selected_providers)
-        ].copy()
-
-        # Display Key Metrics
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Nurse Hours", f"{filtered_df['TOTALNURSEHOURS'].sum():,.0f} hrs")
-        with col2:
-            st.metric("Number of Providers", f"{filtered_df['PROVNAME'].nunique():,}")
-        with col3:
-            st.metric("Number of States", f"{filtered_df['STATE'].nunique():,}")
+            st.plotly_chart(fig5, width="stretch")
+
+        # Chart 3: Scatter Plot - Residents vs. Total Nurse Staffing
+        st.subheader("Residents vs. Total Nurse Staffing Hours")
+        scale_aware_scatter(
+            filtered_provider_df,
+            key="provider_scatter",
+            spec=(version, selected_providers),
+            x="Average Residents Per Day",
+            y="Average Total Nurse Staffing Hours",
+            hover_name="Provider Name",
+            title="Residents vs. Total Nurse Staffing Hours"
+        )
 
+        # Display the data table for provider-level data
         st.markdown("---")
+        st.subheader("Provider-level Data Table")
+        paged_dataframe(filtered_provider_df, key="provider_table")
+        export_frame(filtered_provider_df, key="provider")
 
-        # --- Visualizations ---
+        st.markdown("""_**Conclusion:**_ The first two bar charts show that A Holly Patterson Extended Care Facility has the highest average residents per day 
+                    and the highest resident-to-nurse staffing hours ratio, suggesting potential nurse 
+                    overwork and a possible need for additional staff. However, this could also point to data quality issues. 
+                    The Residents vs. Total Nurse Staffing Hours scatter plot does not indicate a clear correlation, as the data points are widely dispersed. The accompanying data table provides detailed insights into daily resident counts and staffing hours.
+                    """)
+
+
+def staffing_filters(filter_options_df, version, key):
+    """
+    Renders the state multiselect and provider search and returns them as query filters.
 
-        st.header("Total Nurse Hours by Month")
-        if not filtered_df.empty:
-            monthly_data = filtered_df.groupby('WORKMONTH')['TOTALNURSEHOURS'].sum().reset_index()
-            fig_monthly = px.bar(
-                monthly_data,
-                x='WORKMONTH',
+    Selecting every state or "All providers" yields None (no filter), so the default view
+    shares one cached query.
+    """
+    all_states = sorted(filter_options_df['STATE'].unique())
+    # Kept for current_filters(), which normalizes the selection before this renders on the next run.
+    st.session_state[f"{key}_all_states"] = all_states
+    selected_states = st.multiselect("Select State(s)", all_states, default=all_states, key=f"{key}_states")
+
+    index = get_provider_index(
+        "nurse_hours_filter_options", version, filter_options_df['PROVNAME'], filter_options_df['PROVNUM']
+    )
+    selected_providers = provider_picker(index, key=f"{key}_providers")
+
+    return normalize_filter(selected_states, all_states), selected_providers
+
+
+def daily_rows_export(filters, key):
+    """Offers every daily PBJ row behind the filtered view, streamed from the warehouse on click."""
+    st.subheader("Daily Staffing Rows")
+    st.caption("All daily PBJ staffing rows for the selected states and providers, including employee and contract hours by role.")
+    export_download(f"{key}_daily", "daily_nurse_staffing", lambda: stream_daily_staffing_rows(**filters))
+
+
+def nurse_hours_tab_view(data, filter_options_df, version):
+    st.title("Daily Nurse Staffing Analysis")
+    st.markdown("Use the filters below to analyze total nurse hours by provider, state, and time period.")
+
+    # --- Filters on the Main Page ---
+    st.header("Filter Data")
+    states, providers = staffing_filters(filter_options_df, version, "nurse_hours")
+    grain = st.radio(
+        "Granularity", list(GRAIN_LABELS), index=list(GRAIN_LABELS).index(DEFAULT_GRAIN), format_func=GRAIN_LABELS.get, horizontal=True, key="nurse_hours_grain"
+    )
+    period = TIME_GRAINS[grain]
+
+    # --- Apply Filters ---
+    # The filters are bound into the query, so only the selected rows leave the warehouse.
+    # Every grain is read from a rollup kept at that grain, so each costs about the same.
+    filters = dict(states=states, providers=providers)
+    data.prefetch([("nurse_hours", dict(filters, grain=grain)), ("nurse_hours_ranked", dict(filters, n=TOP_PROVIDERS))])
+    filtered_df = data.get("nurse_hours", **filters, grain=grain)
+
+    # Display Key Metrics
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Nurse Hours", f"{filtered_df['TOTALNURSEHOURS'].sum():,.0f} hrs")
+    with col2:
+        st.metric("Number of Providers", f"{filtered_df['PROVNAME'].nunique():,}")
+    with col3:
+        st.metric("Number of States", f"{filtered_df['STATE'].nunique():,}")
+
+    st.markdown("---")
+
+    # --- Visualizations ---
+
+    st.header(f"Total Nurse Hours by {GRAIN_LABELS[grain]}")
+    if not filtered_df.empty:
+        period_data = filtered_df.groupby(period, observed=True)['TOTALNURSEHOURS'].sum().reset_index()
+        fig_monthly = cached_figure(
+            ("nurse_hours_by_period", data.version("nurse_hours", **filters, grain=grain), filters, grain),
+            lambda: px.bar(
+                period_data,
+                x=period,
                 y='TOTALNURSEHOURS',
                 title='Total Nurse Hours Over Time',
-                labels={'WORKMONTH': 'Month', 'TOTALNURSEHOURS': 'Total Nurse Hours'},
+                labels={period: GRAIN_LABELS[grain], 'TOTALNURSEHOURS': 'Total Nurse Hours'},
                 color_discrete_sequence=px.colors.qualitative.Plotly
-            )
-            fig_monthly.update_layout(xaxis_title="Month", yaxis_title="Total Nurse Hours", showlegend=False)
-            st.plotly_chart(fig_monthly, use_container_width=True)
-        else:
-            st.warning("No data to display. Please adjust your filters.")
-
-        st.header("Nurse Hours by Provider and State")
-        if not filtered_df.empty:
-            provider_state_data = filtered_df.groupby(['PROVNAME', 'STATE'])['TOTALNURSEHOURS'].sum().reset_index()
-            fig_provider = px.bar(
+            ).update_layout(xaxis_title=GRAIN_LABELS[grain], yaxis_title="Total Nurse Hours", showlegend=False),
+        )
+        st.plotly_chart(fig_monthly, width="stretch")
+    else:
+        st.warning("No data to display. Please adjust your filters.")
+
+    st.header("Nurse Hours by Provider and State")
+    if not filtered_df.empty:
+        # Ranked in the warehouse: the top providers plus one "Other" row for the rest.
+        provider_state_data = data.get("nurse_hours_ranked", **filters, n=TOP_PROVIDERS)
+        fig_provider = cached_figure(
+            ("nurse_hours_by_provider", data.version("nurse_hours_ranked", **filters, n=TOP_PROVIDERS), filters, TOP_PROVIDERS),
+            lambda: px.bar(
                 provider_state_data,
                 x='TOTALNURSEHOURS',
                 y='PROVNAME',
                 color='STATE',
-                title='Total Nurse Hours by Provider and State',
+                title=f'Total Nurse Hours by Provider and State (Top {TOP_PROVIDERS})',
                 labels={'TOTALNURSEHOURS': 'Total Nurse Hours', 'PROVNAME': 'Provider Name'},
                 orientation='h'
-            )
-            st.plotly_chart(fig_provider, use_container_width=True)
-        else:
-            st.warning("No data to display. Please adjust your filters.")
-
-        st.header("Raw Data")
-        st.dataframe(filtered_df)
-        st.markdown("""_**Conclusion:**_ The vertical bar graph represents the total nurse hours by month. 
-                    The horizontal bar graph presents the total nurse hours by provider and state. 
-                    Miller's Merry Manor has the highest nurse hours. The data table gives the detailed 
-                    information on total nurse hours for each provider and state.""")
-
-    with contracting_hours_tab:
-        # --- Main Dashboard ---
-        st.title("Hospitals with Highest Contracted Hours")
-        st.markdown("This dashboard identifies hospitals with the highest total contracted nursing hours, which can serve as a proxy for overtime or high-demand staffing.")
-
-        # --- Filters ---
-        st.header("Filter Data")
-
-        df = contracting_hours_df
-
-        all_states = sorted(df['STATE'].unique())
-        selected_states = st.multiselect("Select State(s)", all_states, default=all_states)
-
-        # Filter providers based on selected states
-        filtered_providers = df[df['STATE'].isin(selected_states)]['PROVNAME'].unique()
-        all_providers = sorted(df['PROVNAME'].unique())
-        selected_providers = st.multiselect("Select Provider(s)", all_providers, default=all_providers)
-
-        # --- Apply Filters ---
-        filtered_df = df[
-            df['STATE'].isin(selected_states) &
-            df['PROVNAME'].isin(selected_providers)
-        ].copy()
-
-        # Display Key Metrics
-        col1, col2 = st.columns(2)
-        with col1:
-            st.metric("Total Contracted Hours", f"{filtered_df['TotalContractedHours'].sum():,.0f} hrs")
-        with col2:
-            st.metric("Number of Providers", f"{filtered_df['PROVNAME'].nunique():,}")
-
-        st.markdown("---")
-
-        # --- Visualizations ---
-
-        st.header("Top 10 Hospitals by Contracted Hours")
-        if not filtered_df.empty:
-            top_hospitals = filtered_df.nlargest(20, 'TotalContractedHours')
-            fig_top = px.bar(
-                top_hospitals,
+            ).update_layout(yaxis={'categoryorder': 'array', 'categoryarray': provider_state_data['PROVNAME'].tolist()[::-1]}),
+        )
+        st.plotly_chart(fig_provider, width="stretch")
+    else:
+        st.warning("No data to display. Please adjust your filters.")
+
+    st.header("Raw Data")
+    paged_dataframe(filtered_df, key="nurse_hours_table")
+    export_frame(filtered_df, key="nurse_hours")
+    daily_rows_export(filters, key="nurse_hours")
+    st.markdown("""_**Conclusion:**_ The vertical bar graph represents the total nurse hours by the selected period. 
+                The horizontal bar graph presents the total nurse hours by provider and state. 
+                Miller's Merry Manor has the highest nurse hours. The data table gives the detailed 
+                information on total nurse hours for each provider and state.""")
+
+
+def contracting_hours_tab_view(data, filter_options_df, version):
+    # --- Main Dashboard ---
+    st.title("Hospitals with Highest Contracted Hours")
+    st.markdown("This dashboard identifies hospitals with the highest total contracted nursing hours, which can serve as a proxy for overtime or high-demand staffing.")
+
+    # --- Filters ---
+    st.header("Filter Data")
+    states, providers = staffing_filters(filter_options_df, version, "contract_hours")
+
+    # --- Apply Filters ---
+    # The top 10 is taken in the warehouse after the filters are applied; the remaining
+    # hospitals arrive rolled up into one "Other" row.
+    filtered_df = data.get("contract_hours", states=states, providers=providers)
+
+    # Display Key Metrics
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Total Contracted Hours", f"{filtered_df['TotalContractedHours'].sum():,.0f} hrs")
+    with col2:
+        st.metric("Number of Providers", f"{filtered_df['Groups'].sum():,}")
+
+    st.markdown("---")
+
+    # --- Visualizations ---
+
+    st.header("Top 10 Hospitals by Contracted Hours")
+    if not filtered_df.empty:
+        fig_top = cached_figure(
+            ("contract_hours_by_provider", data.version("contract_hours", states=states, providers=providers), states, providers),
+            lambda: px.bar(
+                filtered_df,
                 x="TotalContractedHours",
                 y="PROVNAME",
                 orientation='h',
                 color="STATE",
                 title='Total Contracted Hours by Hospital',
                 labels={'TotalContractedHours': 'Total Contracted Hours', 'PROVNAME': 'Provider Name'}
-            )
-            fig_top.update_layout(yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig_top, use_container_width=True)
-        else:
-            st.warning("No data to display. Please adjust your filters.")
-
-        st.header("Raw Data")
-        st.dataframe(filtered_df)
-
-        st.markdown("""_**Conclusion:**_ Used total contracted hours for each hospital as a 
-                    proxy for overtime or high-demand staffing. The results are ordered to 
-                    show the hospitals with the highest hours at the top.""")
-
-
+            ).update_layout(yaxis={'categoryorder': 'array', 'categoryarray': filtered_df['PROVNAME'].tolist()[::-1]}),
+        )
+        st.plotly_chart(fig_top, width="stretch")
+    else:
+        st.warning("No data to display. Please adjust your filters.")
+
+    st.header("Raw Data")
+    paged_dataframe(filtered_df, key="contract_hours_table")
+    export_frame(filtered_df, key="contract_hours")
+    daily_rows_export(dict(states=states, providers=providers), key="contract_hours")
+
+    st.markdown("""_**Conclusion:**_ Used total contracted hours for each hospital as a 
+                proxy for overtime or high-demand staffing. The results are ordered to 
+                show the hospitals with the highest hours at the top.""")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app's modules import each other by their top-level names, as `streamlit run` puts
+# the app directory on the path.
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit")
+sys.path.insert(0, APP_DIR)
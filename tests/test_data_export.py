@@ -0,0 +1,41 @@
+import os
+import time
+
+import data_export
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pytest
+from data_export import EXPORT_FORMATS, TOKEN_PATTERN, prepare_export, write_export
+
+
+def read_export(path, export_format):
+    if export_format == "Parquet":
+        return pq.read_table(path)
+    return pacsv.read_csv(path)
+
+
+@pytest.mark.parametrize("export_format", list(EXPORT_FORMATS))
+def test_later_chunk_wider_than_the_first(export_format, tmp_path):
+    # Warehouse chunks of one INT column can arrive as int8 first and int16 later.
+    batches = [
+        pa.record_batch({"MDScensus": pa.array([1, 2], pa.int8()), "Hrs_RN": pa.array([0.5, 1.5], pa.float32())}),
+        pa.record_batch({"MDScensus": pa.array([300, -300], pa.int16()), "Hrs_RN": pa.array([2.5, 1e300], pa.float64())}),
+    ]
+    suffix, _ = EXPORT_FORMATS[export_format]
+    path = tmp_path / f"export{suffix}"
+    write_export(batches, export_format, path)
+    table = read_export(path, export_format)
+    assert table.column("MDScensus").to_pylist() == [1, 2, 300, -300]
+    assert table.column("Hrs_RN").to_pylist() == [0.5, 1.5, 2.5, 1e300]
+
+
+def test_prepared_exports_are_swept_once_expired(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_export, "EXPORT_DIR", str(tmp_path))
+    batch = pa.record_batch({"PROVNUM": ["015009"]})
+    old = prepare_export([batch], "Parquet")
+    assert TOKEN_PATTERN.fullmatch(old)
+    expired = time.time() - data_export.EXPORT_MAX_AGE_SECONDS - 1
+    os.utime(tmp_path / old, (expired, expired))
+    new = prepare_export([batch], "CSV (gzip)")
+    assert sorted(os.listdir(tmp_path)) == [new]
@@ -0,0 +1,27 @@
+import pandas as pd
+
+import dashboard_data
+import disk_cache
+from dataset_store import DatasetStore
+from query_log import QueryLog
+
+
+def test_disk_cache_misses_once_the_queries_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(dashboard_data, "source_version", lambda name: ("2024-06-30", 100))
+    monkeypatch.setattr(dashboard_data, "get_query_log", lambda: QueryLog(100))
+    # A fresh store per request, as after a restart, so only the disk cache is shared.
+    monkeypatch.setattr(dashboard_data, "get_dataset_store", lambda: DatasetStore(10))
+    loads = []
+
+    def load_state_data():
+        loads.append(dashboard_data.QUERY_SOURCE_HASH)
+        return pd.DataFrame({"State": ["NY"], "Loaded": [len(loads)]})
+
+    monkeypatch.setitem(dashboard_data.DATASET_LOADERS, "state", load_state_data)
+    assert dashboard_data.load_dataset("state")[1]["Loaded"].item() == 1
+    assert dashboard_data.load_dataset("state")[1]["Loaded"].item() == 1
+    # A deploy changing the SQL changes the module's source hash.
+    monkeypatch.setattr(dashboard_data, "QUERY_SOURCE_HASH", "0" * 64)
+    assert dashboard_data.load_dataset("state")[1]["Loaded"].item() == 2
+    assert len(loads) == 2
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import dashboard_data
+from local_backend import LocalBackend, snapshot_path
+from query_log import QueryLog
+
+HOUR_COLUMNS = [
+    f"Hrs_{role}{suffix}"
+    for role in ["RNDON", "RNadmin", "LPNadmin", "LPN", "CNA", "NAtrn", "MedAide"]
+    for suffix in ["", "_ctr"]
+]
+DAY = 24 * 3600
+
+
+def staffing(days, providers=("A", "B")):
+    rows = []
+    for day in days:
+        for provider in providers:
+            rows.append({
+                "PROVNUM": provider,
+                "PROVNAME": f"Provider {provider}",
+                "STATE": "NY",
+                "WorkDate": day,
+                **{column: 1.0 for column in HOUR_COLUMNS},
+            })
+    return pd.DataFrame(rows)
+
+
+def write_staffing(data_dir, df, modified):
+    path = snapshot_path("daily_nurse_staffing_target", data_dir)
+    df.to_parquet(path, index=False)
+    os.utime(path, (modified, modified))
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    days = pd.date_range("2024-01-01", "2024-03-31").date
+    write_staffing(data_dir, staffing(days), time.time() - DAY)
+    pd.DataFrame({
+        "State": ["NY"],
+        "Processing Date": [pd.Timestamp("2024-03-01")],
+        "Provider Name": ["Provider A"],
+        "Average Number of Residents per Day": [80.0],
+        "Number of Certified Beds": [100],
+        "Reported Total Nurse Staffing Hours per Resident per Day": [3.0],
+        "Reported RN Staffing Hours per Resident per Day": [1.0],
+        "Reported LPN Staffing Hours per Resident per Day": [1.0],
+        "Reported Nurse Aide Staffing Hours per Resident per Day": [1.0],
+    }).to_parquet(snapshot_path("nh_provider_info_target", data_dir), index=False)
+    pd.DataFrame({"Provider Name": ["Provider A"]}).to_parquet(
+        snapshot_path("provider_quality_reporting_target", data_dir), index=False
+    )
+    local = LocalBackend(data_dir)
+    log = QueryLog(100)
+    monkeypatch.setattr(dashboard_data, "get_backend", lambda: local)
+    monkeypatch.setattr(dashboard_data, "get_query_log", lambda: log)
+    return data_dir, days, log
+
+
+def rows(df, grain):
+    df = df.astype({"PROVNAME": str, "STATE": str})
+    df[dashboard_data.TIME_GRAINS[grain]] = pd.to_datetime(df[dashboard_data.TIME_GRAINS[grain]])
+    return df.sort_values(["PROVNAME", dashboard_data.TIME_GRAINS[grain]], ignore_index=True)
+
+
+@pytest.mark.parametrize("grain", ["day", "week", "month", "quarter"])
+def test_refresh_reads_new_periods_in_one_query(backend, grain):
+    data_dir, days, log = backend
+    previous = dashboard_data.load_nurse_hours_data(grain=grain)
+    # A load adding April, recorded as changing no earlier day.
+    april = pd.date_range("2024-04-01", "2024-04-10").date
+    write_staffing(data_dir, staffing([*days, *april]), time.time() - DAY)
+    refreshed = dashboard_data.refresh_nurse_hours_data(previous, grain=grain)
+    assert list(log.frame()["name"]) == ["nurse_hours", "nurse_hours_refresh"]
+    pd.testing.assert_frame_equal(rows(refreshed, grain), rows(dashboard_data.load_nurse_hours_data(grain=grain), grain))
+
+
+@pytest.mark.parametrize("grain", ["day", "week", "month", "quarter"])
+def test_refresh_rereads_periods_with_changed_days(backend, grain):
+    data_dir, days, log = backend
+    previous = dashboard_data.load_nurse_hours_data(grain=grain)
+    # A late correction to January, and provider B's February withdrawn.
+    corrected = staffing(days)
+    corrected.loc[corrected["WorkDate"] == days[0], "Hrs_CNA"] = 9.0
+    corrected = corrected[~((corrected["PROVNUM"] == "B") & (pd.to_datetime(corrected["WorkDate"]).dt.month == 2))]
+    write_staffing(data_dir, corrected, time.time())
+    refreshed = dashboard_data.refresh_nurse_hours_data(previous, grain=grain)
+    assert list(log.frame()["name"]) == ["nurse_hours", "nurse_hours_refresh"]
+    pd.testing.assert_frame_equal(rows(refreshed, grain), rows(dashboard_data.load_nurse_hours_data(grain=grain), grain))
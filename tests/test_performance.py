@@ -0,0 +1,29 @@
+import pandas as pd
+import performance
+from query_log import QueryLog
+
+
+def render_with_log(log, monkeypatch):
+    monkeypatch.setattr(performance, "get_query_log", lambda: log)
+    tables = []
+    monkeypatch.setattr(performance.st, "dataframe", lambda df, **kwargs: tables.append(df))
+    performance.performance_metrics()
+    return tables
+
+
+def test_error_only_log(monkeypatch):
+    log = QueryLog(100)
+    log.record("query", "nurse_hours", 0.2, error="ProgrammingError")
+    log.record("query", "nurse_hours", 0.4, error="OperationalError")
+    summary = render_with_log(log, monkeypatch)[-1]
+    assert summary.loc["nurse_hours", "errors"] == 2
+    assert summary.loc["nurse_hours", "count"] == 2
+    assert pd.isna(summary.loc["nurse_hours", "fetch p50"])
+
+
+def test_streamed_queries_without_fetch_time(monkeypatch):
+    log = QueryLog(100)
+    log.record("query", "daily_staffing_export", 3.0, rows=1000, bytes=64000)
+    summary = render_with_log(log, monkeypatch)[-1]
+    assert summary.loc["daily_staffing_export", "rows p50"] == 1000
+    assert summary.loc["daily_staffing_export", "errors"] == 0